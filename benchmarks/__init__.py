@@ -0,0 +1,147 @@
+"""Benchmarks for the hot paths of the puppy application.
+
+Every benchmark runs against a throwaway SQLite database and reports wall
+time together with the number of SQL statements it issued.  Run them through
+the management script::
+
+    python manage.py benchmark
+    python manage.py benchmark -n bulk_notify
+    python manage.py benchmark --save-baseline
+
+Results are compared with ``benchmarks/baseline.json``: a case that issues
+more statements than its baseline is reported as a regression and fails
+the run.  Statement counts are exact on any machine.  Wall time depends on
+the machine and its load, so it is only reported, as a ratio to the
+baseline, and never fails the run; compare cases within one run (e.g.
+cached against uncached) to judge speed.
+"""
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+registry = OrderedDict()
+
+
+def benchmark(name):
+    """Register ``f(app)`` as a benchmark; it yields one result dict per case."""
+    def decorator(f):
+        registry[name] = f
+        return f
+    return decorator
+
+
+class QueryCounter(object):
+    """Count the SQL statements sent to ``engine`` inside a ``with`` block."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+class Timer(object):
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.seconds = None
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def create_benchmark_app(memory=False):
+    from puppy import create_app
+    app = create_app('testing')
+    if memory:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        return app, None
+    fd, path = tempfile.mkstemp(prefix='puppy-bench-', suffix='.sqlite')
+    os.close(fd)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    return app, path
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    baseline = load_baseline(path)
+    for name, cases in results.items():
+        baseline[name] = cases
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(result, expected):
+    """Return a description of how ``result`` regressed from ``expected``, or None."""
+    if expected is None or result['queries'] <= expected['queries']:
+        return None
+    return 'queries {} > {}'.format(result['queries'], expected['queries'])
+
+
+def report(name, result, expected=None, regression=None):
+    extra = ' '.join('{}={}'.format(k, v) for k, v in sorted(result.items())
+                     if k not in ('case', 'seconds', 'queries'))
+    ratio = ''
+    if expected and expected['seconds']:
+        ratio = '({:.2f}x)'.format(result['seconds'] / expected['seconds'])
+    print('{:<20} {:<44} {:>10.4f}s {:>8} {:>7} queries  {}{}'.format(
+        name, result['case'], result['seconds'], ratio, result['queries'], extra,
+        '  REGRESSION: ' + regression if regression else ''))
+
+
+def run(names=None, memory=False, save=False, baseline_path=BASELINE_PATH):
+    """Run the benchmarks; returns the list of ``(name, case, problem)`` regressions."""
+    from puppy import db
+    baseline = load_baseline(baseline_path)
+    results = OrderedDict()
+    regressions = []
+    for name, func in registry.items():
+        if names and name not in names:
+            continue
+        app, path = create_benchmark_app(memory)
+        results[name] = OrderedDict()
+        try:
+            with app.app_context():
+                db.create_all()
+                for result in func(app):
+                    expected = None if save else baseline.get(name, {}).get(result['case'])
+                    regression = compare(result, expected)
+                    if regression:
+                        regressions.append((name, result['case'], regression))
+                    report(name, result, expected, regression)
+                    results[name][result['case']] = {'seconds': round(result['seconds'], 6),
+                                                      'queries': result['queries']}
+                db.session.remove()
+                db.get_engine(app).dispose()
+        finally:
+            if path is not None:
+                os.remove(path)
+    if save:
+        save_baseline(results, baseline_path)
+        print('Saved baseline for {} benchmarks to {}'.format(len(results), baseline_path))
+    return regressions
+
+
+from . import notifications, identity, hashing, tokens, startup, models, ventures
@@ -0,0 +1,53 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from puppy import db, password_hasher
+from puppy.models import User
+from . import benchmark, QueryCounter, Timer
+
+
+@benchmark('verify_password')
+def verify_password(app):
+    user = User(email='bench@puppy.example', password='bench')
+    db.session.add(user)
+    db.session.commit()
+    logins = 50
+    cores = os.cpu_count() or 1
+
+    with QueryCounter(db.engine) as queries, Timer() as timer:
+        for _ in range(logins):
+            user.verify_password('bench')
+    yield {'case': '{}, inline'.format(password_hasher.method),
+           'seconds': timer.seconds, 'queries': queries.count,
+           'logins_per_sec': round(logins / timer.seconds, 1)}
+
+    user.password_hash = generate_password_hash('bench', 'pbkdf2:sha1:1000')
+    db.session.commit()
+    with QueryCounter(db.engine) as queries, Timer() as timer:
+        user.verify_password('bench')
+        db.session.commit()
+    yield {'case': 'legacy hash, rehashed on login', 'seconds': timer.seconds,
+           'queries': queries.count, 'upgraded': not password_hasher.needs_rehash(user.password_hash)}
+
+    app.config['PASSWORD_HASH_WORKERS'] = cores
+    app.config['PASSWORD_HASH_MAX_CONCURRENT'] = cores
+    password_hasher.init_app(app)
+    pwhash = password_hasher.hash('bench')
+    with ThreadPoolExecutor(cores) as threads, Timer() as timer:
+        results = list(threads.map(lambda _: password_hasher.verify(pwhash, 'bench'), range(logins * cores)))
+    yield {'case': '{}, pool per core'.format(password_hasher.method),
+           'seconds': timer.seconds, 'queries': 0, 'ok': all(results), 'pool': cores,
+           'logins_per_sec_per_core': round(logins * cores / timer.seconds / cores, 1)}
+
+    # Saturate the pool and check that extra requests are turned away fast.
+    app.config['PASSWORD_HASH_MAX_CONCURRENT'] = 1
+    app.config['PASSWORD_HASH_QUEUE_TIMEOUT'] = 0.01
+    password_hasher.init_app(app)
+    with ThreadPoolExecutor(4) as threads, Timer() as timer:
+        futures = [threads.submit(password_hasher.verify, pwhash, 'bench') for _ in range(4)]
+        rejected = sum(1 for future in futures if future.exception() is not None)
+    yield {'case': '4 concurrent, 1 slot', 'seconds': timer.seconds, 'queries': 0,
+           'rejected': rejected}
+    password_hasher.executor.shutdown()
@@ -0,0 +1,44 @@
+from puppy import db, identity_cache
+from puppy.models import Group, User, initialize_database, load_user
+from . import benchmark, QueryCounter, Timer
+
+
+@benchmark('load_user')
+def load_user_benchmark(app):
+    initialize_database()
+    for cached in (False, True):
+        identity_cache.clear()
+        with QueryCounter(db.engine) as queries, Timer() as timer:
+            for _ in range(1000):
+                if not cached:
+                    identity_cache.clear()
+                user = load_user('1')
+                user.is_administrator
+                db.session.remove()
+        yield {'case': '1000 loads, {}'.format('cached' if cached else 'uncached'),
+               'seconds': timer.seconds,
+               'queries': queries.count}
+
+
+@benchmark('authenticated_views')
+def authenticated_views(app):
+    initialize_database()
+    user = User(email='bench@puppy.example', password='bench')
+    user.groups.append(Group.query.filter_by(name='User').first())
+    db.session.add(user)
+    db.session.commit()
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'bench@puppy.example', 'password': 'bench'})
+    for cached in (False, True):
+        identity_cache.clear()
+        with QueryCounter(db.engine) as queries, Timer() as timer:
+            for _ in range(200):
+                if not cached:
+                    identity_cache.clear()
+                client.get('/')
+                # The benchmark's app context outlives each request, so drop
+                # the session the way the request teardown normally would.
+                db.session.remove()
+        yield {'case': '200 page views, {}'.format('cached' if cached else 'uncached'),
+               'seconds': timer.seconds,
+               'queries': queries.count}
@@ -0,0 +1,221 @@
+"""Replay a weighted mix of HTTP requests and report latency per endpoint.
+
+The mix is a list of scenarios; each iteration picks one by weight and runs
+its requests in a fresh session, so cookies set by a login carry over to the
+page views that follow it.  Requests go through the WSGI test client, or to a
+running server when a base URL is given::
+
+    python manage.py loadtest -n 2000
+    python manage.py loadtest --url http://127.0.0.1:8000 -c 8 -o after.json
+    python manage.py loadtest --compare before.json
+
+Members log in as users created by ``manage.py seed`` (password ``puppy``).
+A remote server should run with CSRF protection and rate limiting disabled,
+otherwise the form posts are rejected; in-process runs turn both off.
+When SQL instrumentation is enabled the statement count of every response is
+read from its ``Server-Timing`` header.
+"""
+import http.cookiejar
+import math
+import random
+import re
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, OrderedDict
+
+DEFAULT_MIX = [
+    {'name': 'anonymous', 'weight': 60, 'requests': [
+        {'endpoint': 'main.index', 'path': '/'},
+        {'endpoint': 'main.about', 'path': '/about'},
+        {'endpoint': 'meetups.index', 'path': '/meetups/'},
+        {'endpoint': 'meetups.monthly', 'path': '/meetups/monthly'},
+        {'endpoint': 'meetups.programmingnight', 'path': '/meetups/programming-night'},
+    ]},
+    {'name': 'member', 'weight': 30, 'requests': [
+        {'endpoint': 'auth.login', 'method': 'POST', 'path': '/auth/login',
+         'data': {'email': '{email}', 'password': '{password}'}},
+        {'endpoint': 'main.index', 'path': '/'},
+        {'endpoint': 'api.get_notifications', 'path': '/api/v1/notifications/'},
+        {'endpoint': 'api.get_unread_count', 'path': '/api/v1/notifications/unread-count'},
+        {'endpoint': 'meetups.index', 'path': '/meetups/'},
+    ]},
+    {'name': 'registration', 'weight': 10, 'requests': [
+        {'endpoint': 'auth.register', 'method': 'POST', 'path': '/auth/register',
+         'data': {'email': 'loadtest{n}@example.com', 'username': 'loadtest{n}',
+                  'password': '{password}', 'password2': '{password}'}},
+    ]},
+]
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class ClientSession(object):
+    """A cookie-keeping session on the WSGI test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        try:
+            response = self.client.open(path, method=method, data=data)
+        except Exception:
+            # Debug and testing apps propagate view errors instead of
+            # answering 500.
+            return 500, []
+        return response.status_code, response.headers.getlist('Server-Timing')
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession(object):
+    """A cookie-keeping session against a running server; redirects are not followed."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode('utf-8') if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status, response.headers.get_all('Server-Timing') or []
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get_all('Server-Timing') or []
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of the sorted list ``values``."""
+    if not values:
+        return None
+    return values[max(int(math.ceil(p / 100.0 * len(values))) - 1, 0)]
+
+
+class LoadTest(object):
+    def __init__(self, session_factory, mix=None, emails=None, password='puppy', seed=0):
+        self.session_factory = session_factory
+        self.mix = mix or DEFAULT_MIX
+        self.emails = emails or []
+        self.password = password
+        self.random = random.Random(seed)
+        self.run_id = int(time.time())
+        self.lock = threading.Lock()
+        self.issued = 0
+        self.samples = []
+
+    def _claim(self, limit):
+        with self.lock:
+            if self.issued >= limit:
+                return None
+            self.issued += 1
+            scenario = self._weighted_choice()
+            values = {'n': '{}_{}'.format(self.run_id, self.issued),
+                      'email': self.random.choice(self.emails) if self.emails else '',
+                      'password': self.password}
+            return scenario, values
+
+    def _weighted_choice(self):
+        point = self.random.uniform(0, sum(s['weight'] for s in self.mix))
+        for scenario in self.mix:
+            point -= scenario['weight']
+            if point <= 0:
+                return scenario
+        return self.mix[-1]
+
+    def _worker(self, limit):
+        samples = []
+        while True:
+            claimed = self._claim(limit)
+            if claimed is None:
+                break
+            scenario, values = claimed
+            session = self.session_factory()
+            for step in scenario['requests']:
+                data = step.get('data')
+                if data is not None:
+                    data = dict((key, value.format(**values)) for key, value in data.items())
+                start = time.perf_counter()
+                status, timing = session.request(step.get('method', 'GET'), step['path'], data)
+                elapsed = time.perf_counter() - start
+                queries = None
+                for header in timing:
+                    match = QUERIES.search(header)
+                    if match:
+                        queries = int(match.group(1))
+                samples.append((step['endpoint'], status, elapsed, queries))
+        with self.lock:
+            self.samples.extend(samples)
+
+    def run(self, iterations=100, concurrency=1):
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._worker, args=(iterations,)) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.summarize(time.perf_counter() - start, concurrency)
+
+    def summarize(self, duration, concurrency):
+        endpoints = OrderedDict()
+        grouped = OrderedDict()
+        for endpoint, status, elapsed, queries in self.samples:
+            grouped.setdefault(endpoint, []).append((status, elapsed, queries))
+        for endpoint, samples in sorted(grouped.items()):
+            latencies = sorted(elapsed for _, elapsed, _ in samples)
+            queries = [q for _, _, q in samples if q is not None]
+            statuses = Counter(status for status, _, _ in samples)
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'errors': sum(count for status, count in statuses.items() if status >= 500),
+                'statuses': dict((str(status), count) for status, count in statuses.items()),
+                'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+            }
+        return OrderedDict([
+            ('commit', current_commit()),
+            ('concurrency', concurrency),
+            ('duration_s', round(duration, 3)),
+            ('requests', len(self.samples)),
+            ('throughput_rps', round(len(self.samples) / duration, 1) if duration else None),
+            ('endpoints', endpoints),
+        ])
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, baseline=None):
+    print('{} requests in {}s, {} req/s (concurrency {}, commit {})'.format(
+        results['requests'], results['duration_s'], results['throughput_rps'],
+        results['concurrency'], results['commit']))
+    print('{:<28} {:>7} {:>6} {:>9} {:>9} {:>9} {:>8}'.format(
+        'endpoint', 'reqs', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+    for endpoint, stats in results['endpoints'].items():
+        line = '{:<28} {:>7} {:>6} {:>9} {:>9} {:>9} {:>8}'.format(
+            endpoint, stats['requests'], stats['errors'], stats['p50_ms'], stats['p95_ms'],
+            stats['p99_ms'], '-' if stats['queries_mean'] is None else stats['queries_mean'])
+        previous = (baseline or {}).get('endpoints', {}).get(endpoint)
+        if previous:
+            line += '   p95 {:+.1f}%'.format((stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+                                             if previous['p95_ms'] else 0.0)
+            if stats['queries_mean'] is not None and previous.get('queries_mean') is not None:
+                line += ' queries {:+g}'.format(round(stats['queries_mean'] - previous['queries_mean'], 2))
+        print(line)
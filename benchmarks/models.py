@@ -0,0 +1,107 @@
+from puppy import db, group_cache
+from puppy.models import Category, Group, Skill, User, initialize_database, refresh_counts, skills_category, \
+    user_skills
+from . import benchmark, QueryCounter, Timer
+from .notifications import seed_users
+
+
+def seed_categories(fanout=4, depth=5):
+    """Build a ``fanout``-ary category tree ``depth`` levels deep."""
+    level = [None]
+    for depth_index in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(fanout):
+                category = Category(name='Category {}.{}'.format(len(next_level), depth_index),
+                                    parent=parent)
+                db.session.add(category)
+                next_level.append(category)
+        db.session.flush()
+        level = next_level
+    db.session.commit()
+
+
+def seed_skills(skills, users, skills_per_user=5):
+    category_ids = [category_id for (category_id,) in db.session.query(Category.id)]
+    db.session.execute(Skill.__table__.insert(), [
+        {'id': i + 1, 'name': 'Skill {}'.format(i), 'description': 'Benchmark skill'}
+        for i in range(skills)])
+    db.session.execute(skills_category.insert(), [
+        {'skill_id': i + 1, 'category_id': category_ids[(i * 7 + j) % len(category_ids)]}
+        for i in range(skills) for j in range(2)])
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).limit(users)]
+    db.session.execute(user_skills.insert(), [
+        {'user_id': user_id, 'skill_id': (n * 31 + k) % skills + 1}
+        for n, user_id in enumerate(user_ids) for k in range(skills_per_user)])
+    refresh_counts(db.session)
+    db.session.commit()
+
+
+@benchmark('send_message')
+def send_message(app):
+    seed_users(0, 10000)
+    sender = User.query.first()
+    for recipients in (1, 100, 1000):
+        recipient_ids = list(range(2, recipients + 2))
+        with QueryCounter(db.engine) as queries, Timer() as timer:
+            sender.send_message(recipient_ids, 'Benchmark', 'Hello')
+        yield {'case': '{} recipients'.format(recipients),
+               'seconds': timer.seconds, 'queries': queries.count}
+
+
+@benchmark('get_admin_users')
+def get_admin_users(app):
+    initialize_database()
+    seed_users(0, 10000)
+    admin_group = Group.query.filter_by(name='Administrator').first()
+    admin_group.users.extend(User.query.filter(User.id % 200 == 0).all())
+    db.session.commit()
+    for cached in (False, True):
+        group_cache.clear()
+        with QueryCounter(db.engine) as queries, Timer() as timer:
+            for _ in range(100):
+                if not cached:
+                    group_cache.clear()
+                admins = Group.get_admin_users()
+                db.session.remove()
+        yield {'case': '100 calls, {}'.format('cached' if cached else 'uncached'),
+               'seconds': timer.seconds, 'queries': queries.count, 'admins': len(admins)}
+
+
+@benchmark('in_groups')
+def in_groups(app):
+    initialize_database()
+    user = User.query.filter_by(email='admin@puppy').first()
+    with QueryCounter(db.engine) as queries, Timer() as timer:
+        for _ in range(10000):
+            user.in_groups(['Moderator', 'Administrator'])
+            user.in_groups(['User', 'Administrator'], require_all=True)
+    yield {'case': '20000 checks, one user', 'seconds': timer.seconds, 'queries': queries.count}
+
+
+@benchmark('category_str')
+def category_str(app):
+    seed_categories()
+    for lineage in (True, False):
+        if not lineage:
+            Category.query.update({Category.lineage: None})
+            db.session.commit()
+        db.session.remove()
+        # Only the leaves are loaded, so without a lineage their ancestors
+        # have to be fetched while walking up the tree.
+        leaves = Category.query.filter(~Category.children.any()).all()
+        with QueryCounter(db.engine) as queries, Timer() as timer:
+            names = [str(category) for category in leaves]
+        yield {'case': '{} leaf categories, {}'.format(len(names), 'lineage' if lineage else 'parent walk'),
+               'seconds': timer.seconds, 'queries': queries.count}
+
+
+@benchmark('skill_to_json')
+def skill_to_json(app):
+    seed_categories(fanout=4, depth=3)
+    seed_users(0, 5000)
+    seed_skills(500, 5000)
+    db.session.remove()
+    with QueryCounter(db.engine) as queries, Timer() as timer:
+        skills = [skill.to_json() for skill in Skill.query.options(db.subqueryload('categories'))]
+    yield {'case': '{} skills'.format(len(skills)), 'seconds': timer.seconds, 'queries': queries.count}
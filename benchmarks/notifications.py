@@ -0,0 +1,79 @@
+import tracemalloc
+
+from puppy import db
+from puppy.models import Notification, User
+from . import benchmark, QueryCounter, Timer
+
+
+def seed_users(start, stop, batch_size=10000):
+    for offset in range(start, stop, batch_size):
+        db.session.execute(User.__table__.insert(), [
+            {'email': 'member{}@example.com'.format(i),
+             'username': 'member{}'.format(i),
+             'approved': i % 2 == 0}
+            for i in range(offset, min(offset + batch_size, stop))])
+    db.session.commit()
+
+
+@benchmark('bulk_notify')
+def bulk_notify(app):
+    seeded = 0
+    for recipients in (1000, 10000, 100000):
+        seed_users(seeded, recipients)
+        seeded = recipients
+        for approved_only in (False, True):
+            Notification.query.delete()
+            db.session.commit()
+            tracemalloc.start()
+            with QueryCounter(db.engine) as queries, Timer() as timer:
+                written = Notification.bulk_notify('Benchmark', 'Hello members', 1,
+                                                   approved_only=approved_only)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            yield {'case': '{} users{}'.format(recipients, ', approved only' if approved_only else ''),
+                   'seconds': timer.seconds,
+                   'queries': queries.count,
+                   'rows': written,
+                   'peak_kib': peak // 1024}
+
+
+def seed_inbox(user_id, count, batch_size=10000):
+    Notification.query.delete()
+    for offset in range(0, count, batch_size):
+        db.session.execute(Notification.__table__.insert(), [
+            {'title': 'Notification {}'.format(i), 'message': 'Hello',
+             'created_by': user_id, 'sent_to': user_id}
+            for i in range(offset, min(offset + batch_size, count))])
+    User.query.filter_by(id=user_id).update({User.unread_count: count})
+    db.session.commit()
+
+
+@benchmark('bulk_mark_read')
+def bulk_mark_read(app):
+    seed_users(0, 1)
+    user_id = User.query.first().id
+    count = 50000
+
+    seed_inbox(user_id, count)
+    with QueryCounter(db.engine) as queries, Timer() as timer:
+        for notification in Notification.query.filter_by(sent_to=user_id):
+            notification.mark_read()
+        db.session.commit()
+    yield {'case': '{} notifications, per instance'.format(count),
+           'seconds': timer.seconds, 'queries': queries.count,
+           'unread_left': User.query.get(user_id).unread_count}
+
+    seed_inbox(user_id, count)
+    with QueryCounter(db.engine) as queries, Timer() as timer:
+        marked = Notification.bulk_mark_read(user_id)
+    yield {'case': '{} notifications, bulk mark read'.format(count),
+           'seconds': timer.seconds, 'queries': queries.count, 'rows': marked,
+           'unread_left': User.query.get(user_id).unread_count}
+
+    seed_inbox(user_id, count)
+    Notification.bulk_mark_read(user_id, ids=list(range(1, 501)))
+    with QueryCounter(db.engine) as queries, Timer() as timer:
+        deleted = Notification.bulk_delete(user_id)
+    yield {'case': '{} notifications, bulk delete'.format(count),
+           'seconds': timer.seconds, 'queries': queries.count, 'rows': deleted,
+           'unread_left': User.query.get(user_id).unread_count}
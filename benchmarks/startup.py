@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from . import benchmark
+
+PROBE = '''
+import json, time
+start = time.perf_counter()
+from puppy import create_app
+app = create_app('testing')
+created = time.perf_counter()
+client = app.test_client()
+client.get('/')
+first = time.perf_counter()
+client.get('/about')
+print(json.dumps([created - start, first - created, time.perf_counter() - first]))
+'''
+
+
+def probe(cache_dir):
+    env = dict(os.environ, JINJA_BYTECODE_CACHE_DIR=cache_dir)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', PROBE], cwd=root, env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+@benchmark('startup')
+def startup(app):
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for case in ('cold bytecode cache', 'warm bytecode cache'):
+            import_seconds, first_request, second_request = probe(cache_dir)
+            yield {'case': case, 'seconds': import_seconds + first_request, 'queries': 0,
+                   'import_ms': round(import_seconds * 1000, 1),
+                   'first_request_ms': round(first_request * 1000, 1),
+                   'next_page_ms': round(second_request * 1000, 1)}
@@ -0,0 +1,48 @@
+from flask import current_app
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
+
+from puppy import db, token_authority
+from puppy.models import User
+from . import benchmark, QueryCounter, Timer
+
+
+def verify_legacy(token):
+    # The verification path User.verify_auth_token used before the token cache.
+    s = Serializer(current_app.config['SECRET_KEY'])
+    try:
+        data = s.loads(token)
+    except:
+        return None
+    return User.query.get(data['id'])
+
+
+@benchmark('verify_auth_token')
+def verify_auth_token(app):
+    user = User(email='bench@puppy.example', password='bench')
+    db.session.add(user)
+    db.session.commit()
+    requests = 2000
+
+    legacy_token = Serializer(app.config['SECRET_KEY'], expires_in=3600).dumps({'id': user.id}).decode('ascii')
+    token = user.generate_auth_token(3600)
+    for name, verify, candidate in (('legacy serializer + query', verify_legacy, legacy_token),
+                                    ('cached token authority', token_authority.verify, token)):
+        with QueryCounter(db.engine) as queries, Timer() as timer:
+            for _ in range(requests):
+                assert verify(candidate) is not None
+                db.session.remove()
+        yield {'case': '{} verifications, {}'.format(requests, name),
+               'seconds': timer.seconds, 'queries': queries.count,
+               'per_sec': int(requests / timer.seconds)}
+
+    # Authentication itself is served from the caches; the one statement per
+    # request is the endpoint reading the stored unread count.
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + token}
+    with QueryCounter(db.engine) as queries, Timer() as timer:
+        for _ in range(requests // 4):
+            assert client.get('/api/v1/notifications/unread-count', headers=headers).status_code == 200
+            db.session.remove()
+    yield {'case': '{} API requests with a token'.format(requests // 4),
+           'seconds': timer.seconds, 'queries': queries.count,
+           'per_sec': int(requests // 4 / timer.seconds)}
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+from puppy import db
+from puppy.models import Company, Resource, Skill, User, Venture, VentureResource, VentureSkill, \
+    initialize_database
+from . import benchmark, QueryCounter, Timer
+from .notifications import seed_users
+
+
+def seed_ventures(ventures, per_venture, user_ids):
+    """Approved ventures with ``per_venture`` resources and skills each."""
+    now = datetime.utcnow()
+    first = (db.session.query(db.func.max(Venture.id)).scalar() or 0) + 1
+    venture_ids = list(range(first, first + ventures))
+    db.session.execute(Venture.__table__.insert(), [
+        {'id': venture_id, 'name': 'Venture {}'.format(venture_id), 'description': 'Benchmark venture',
+         'created_on': now - timedelta(minutes=venture_id), 'created_by': user_ids[venture_id % len(user_ids)],
+         'approved_on': now, 'approved_by': user_ids[0]}
+        for venture_id in venture_ids])
+    db.session.execute(VentureResource.__table__.insert(), [
+        {'venture_id': venture_id, 'company_id': i % 5 + 1, 'resource_id': i + 1}
+        for venture_id in venture_ids for i in range(per_venture)])
+    db.session.execute(VentureSkill.__table__.insert(), [
+        {'venture_id': venture_id, 'skill_id': i + 1, 'user_id': user_ids[i % len(user_ids)]}
+        for venture_id in venture_ids for i in range(per_venture)])
+    db.session.commit()
+    return venture_ids
+
+
+@benchmark('venture_api')
+def venture_api(app):
+    """Venture list and detail under the SQL_STRICT query budget.
+
+    TestingConfig raises once a request exceeds its budget, so a 200 means
+    the endpoint stayed within it; the count must not grow with the number
+    of resources and skills per venture.
+    """
+    initialize_database()
+    seed_users(0, 50)
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+    db.session.execute(Company.__table__.insert(), [{'id': i + 1, 'name': 'Company {}'.format(i)} for i in range(5)])
+    db.session.execute(Resource.__table__.insert(), [{'id': i + 1, 'name': 'Resource {}'.format(i)} for i in range(30)])
+    db.session.execute(Skill.__table__.insert(), [{'id': i + 1, 'name': 'Skill {}'.format(i)} for i in range(30)])
+    db.session.commit()
+    client = app.test_client()
+    headers = {'Authorization': 'Bearer ' + User.query.get(user_ids[-1]).generate_auth_token(3600)}
+    # Warm the identity and group caches so only the endpoints are counted.
+    assert client.get('/api/v1/ventures/', headers=headers).status_code == 200
+    counts = {}
+    for per_venture in (10, 30):
+        venture_ids = seed_ventures(20, per_venture, user_ids)
+        for case, url in (('list', '/api/v1/ventures/?limit=20'),
+                          ('detail', '/api/v1/ventures/{}'.format(venture_ids[0]))):
+            db.session.remove()
+            with QueryCounter(db.engine) as queries, Timer() as timer:
+                response = client.get(url, headers=headers)
+            assert response.status_code == 200, response.status_code
+            counts.setdefault(case, set()).add(queries.count)
+            yield {'case': '{}, {} resources and skills per venture'.format(case, per_venture),
+                   'seconds': timer.seconds, 'queries': queries.count}
+    assert all(len(seen) == 1 for seen in counts.values()), counts
@@ -1,4 +1,5 @@
 import os
+import tempfile
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
@@ -7,7 +8,77 @@ class Config(object):
     TESTING = False
     CSRF_ENABLED = True
     SECRET_KEY = 'this-really-needs-to-be-changed'
-    SQLALCHEMY_DATABASE_URI = os.environ['DATABASE_URL']
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    # Seconds between batched users.last_seen writes, and the minimum age of a
+    # recorded last_seen before the same user is written again.
+    LAST_SEEN_FLUSH_INTERVAL = 60
+    LAST_SEEN_RESOLUTION = 60
+    # Per-process cache of the users loaded by Flask-Login.  Other workers
+    # accept a user's revoked API tokens for up to IDENTITY_CACHE_TTL seconds.
+    IDENTITY_CACHE_SIZE = 1024
+    IDENTITY_CACHE_TTL = 60
+    # Short-lived cache of group member ids, e.g. the admins to notify.
+    GROUP_CACHE_SIZE = 64
+    GROUP_CACHE_TTL = 30
+    # Hashes are made with PASSWORD_HASH_METHOD in a pool of
+    # PASSWORD_HASH_WORKERS processes (0 hashes inline); older hashes are
+    # upgraded on the next successful login.  A request waiting longer than
+    # PASSWORD_HASH_QUEUE_TIMEOUT seconds for one of the
+    # PASSWORD_HASH_MAX_CONCURRENT slots gets a 503.  The slots are lock files
+    # in PASSWORD_HASH_SLOTS, shared by every worker on the host.
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:50000'
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_MAX_CONCURRENT = 4
+    PASSWORD_HASH_SLOTS = os.path.join(tempfile.gettempdir(), 'puppy-hash-slots')
+    PASSWORD_HASH_QUEUE_TIMEOUT = 2
+    # Token buckets, as (capacity, tokens refilled per second), applied per
+    # client address and per submitted email.  The SQLite file is shared by
+    # every worker on the host.
+    RATELIMIT_ENABLED = True
+    # Number of reverse proxies in front of the app whose X-Forwarded-For
+    # and X-Forwarded-Proto headers are trusted; rate limits key on the
+    # client address they report.
+    PROXY_COUNT = 0
+    RATELIMIT_STORAGE = os.path.join(tempfile.gettempdir(), 'puppy-ratelimit.sqlite')
+    RATELIMITS = {
+        'login': (10, 10 / 60.0),
+        'register': (5, 5 / 3600.0),
+        'password_reset': (5, 5 / 3600.0),
+        'change_email': (5, 5 / 3600.0),
+    }
+    # API token signing secrets by key id (SECRET_KEY is used as key
+    # 'default' when empty), the key that signs new tokens, and the size of
+    # the per-process cache of verified tokens.
+    AUTH_TOKEN_KEYS = {}
+    AUTH_TOKEN_CURRENT_KEY = 'default'
+    AUTH_TOKEN_CACHE_SIZE = 4096
+    AUTH_TOKEN_EXPIRATION = 3600
+    # Compiled templates are written here; 'manage.py compile_templates'
+    # fills it at deploy time so fresh workers skip compiling them.
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR') or \
+        os.path.join(basedir, '.jinja-cache')
+    # Per-request SQL statistics (Server-Timing header and JSON log lines).
+    # A statement shape repeated SQL_NPLUSONE_THRESHOLD times is reported
+    # as a likely N+1; SQL_STRICT turns query budget overruns into errors.
+    SQL_INSTRUMENTATION = True
+    SQL_NPLUSONE_THRESHOLD = 5
+    SQL_QUERY_BUDGET = None
+    SQL_STRICT = False
+    # Prometheus metrics; gunicorn_config.py enables multiprocess mode.
+    METRICS_ENABLED = True
+    METRICS_URL = '/metrics'
+    # Default number of search results returned.
+    SEARCH_RESULTS = 20
+    # Member/venture skill matching: full matrix rebuild interval in seconds,
+    # weight of related skills from nearby categories, default result count.
+    MATCHING_REFRESH_INTERVAL = 300
+    MATCHING_PROXIMITY_WEIGHT = 0.5
+    MATCHING_RESULTS = 10
+    # In-memory cache of public pages rendered for anonymous visitors.
+    PAGE_CACHE_ENABLED = True
+    PAGE_CACHE_SIZE = 512
+    API_PAGE_SIZE = 20
+    API_PAGE_SIZE_MAX = 100
 
     @staticmethod
     def init_app(app):
@@ -16,11 +87,14 @@ class Config(object):
 
 class ProductionConfig(Config):
     DEBUG = False
+    # Heroku's router.
+    PROXY_COUNT = 1
 
 
 class StagingConfig(Config):
     DEVELOPMENT = True
     DEBUG = True
+    PROXY_COUNT = 1
 
 
 class DevelopmentConfig(Config):
@@ -30,6 +104,11 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_WORKERS = 0
+    RATELIMIT_STORAGE = ':memory:'
+    SQL_STRICT = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite://'
 
 
 config = {
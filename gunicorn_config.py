@@ -0,0 +1,32 @@
+import glob
+import os
+import tempfile
+
+# Set GUNICORN_PRELOAD=1 to import the application once in the master so
+# that forked workers start warm.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
+
+# Workers write their Prometheus samples here and /metrics aggregates them.
+# This must be set before prometheus_client is imported.
+metrics_dir = os.environ.setdefault('prometheus_multiproc_dir',
+                                    os.path.join(tempfile.gettempdir(), 'puppy-metrics'))
+
+
+def on_starting(server):
+    # Samples left behind by a previous run would be counted again.
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+
+def post_fork(server, worker):
+    # Never share database connections opened in the master with a worker.
+    if server.cfg.preload_app:
+        from manage import app
+        from puppy import db
+        db.get_engine(app).dispose()
+
+
+def worker_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,5 @@
 import os
-from puppy import create_app, db
+from puppy import create_app, db, rate_limiter
 from flask.ext.script import Manager
 from flask.ext.migrate import Migrate, MigrateCommand
 
@@ -12,5 +12,140 @@ manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
 
+@manager.command
+def build_assets():
+    """Write fingerprinted, precompressed static assets and their manifest."""
+    from puppy.assets import build_assets
+    manifest = build_assets(app.static_folder)
+    print('Fingerprinted {} assets, {} with compressed variants'.format(
+        len(manifest['assets']), len(manifest['encodings'])))
+
+
+@manager.command
+def compile_templates():
+    """Compile every template into the Jinja bytecode cache."""
+    compiled = 0
+    for name in app.jinja_env.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+            compiled += 1
+        except Exception as e:
+            print('Skipped {}: {}'.format(name, e))
+    print('Compiled {} templates into {}'.format(compiled, app.config['JINJA_BYTECODE_CACHE_DIR']))
+
+
+@manager.option('-n', '--iterations', dest='iterations', type=int, default=200,
+                help='Number of scenarios to replay (default: 200)')
+@manager.option('-c', '--concurrency', dest='concurrency', type=int, default=1)
+@manager.option('-u', '--url', dest='url', default=None,
+                help='Base URL of a running server (default: drive the app in-process)')
+@manager.option('-s', '--script', dest='script', default=None,
+                help='JSON file with the request mix (default: built-in mix)')
+@manager.option('-o', '--output', dest='output', default=None, help='Write the results to this JSON file')
+@manager.option('--compare', dest='compare', default=None, help='Results JSON of an earlier run to compare with')
+@manager.option('--seed', dest='seed', type=int, default=0)
+def loadtest(iterations=200, concurrency=1, url=None, script=None, output=None, compare=None, seed=0):
+    """Replay a mix of HTTP requests and report per-endpoint latency percentiles."""
+    import json
+    import logging
+    from benchmarks.loadtest import LoadTest, ClientSession, HTTPSession, report
+    from puppy.models import User
+    mix = None
+    if script:
+        with open(script) as f:
+            mix = json.load(f)
+    emails = [email for (email,) in db.session.query(User.email)
+              .filter(User.email.like('user%@example.com')).order_by(User.id).limit(1000)]
+    db.session.remove()
+    if url:
+        session_factory = lambda: HTTPSession(url)
+    else:
+        app.config['WTF_CSRF_ENABLED'] = False
+        rate_limiter.enabled = False
+        # Per-request debug logging would dominate the timings.
+        app.logger.setLevel(logging.WARNING)
+        session_factory = lambda: ClientSession(app)
+    results = LoadTest(session_factory, mix, emails, seed=seed).run(iterations, concurrency)
+    baseline = None
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+@manager.option('--users', type=int, default=1000)
+@manager.option('--groups', type=int, default=10)
+@manager.option('--categories', type=int, default=100)
+@manager.option('--category-depth', dest='category_depth', type=int, default=3)
+@manager.option('--skills', type=int, default=200)
+@manager.option('--companies', type=int, default=50)
+@manager.option('--resources', type=int, default=100)
+@manager.option('--ventures', type=int, default=200)
+@manager.option('--notifications', type=int, default=5000)
+@manager.option('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+@manager.option('--batch-size', dest='batch_size', type=int, default=10000)
+def seed(**volumes):
+    """Fill the database with a deterministic synthetic dataset."""
+    import time
+    from puppy.seed import seed_database
+    start = time.time()
+    counts = seed_database(**volumes)
+    for table, count in sorted(counts.items()):
+        print('{:<24} {:>10}'.format(table, count))
+    print('Seeded {} rows in {:.1f}s'.format(sum(counts.values()), time.time() - start))
+
+
+@manager.command
+def reindex():
+    """Rebuild the search index from scratch."""
+    from puppy.search import search_index
+    for kind, count in search_index.rebuild().items():
+        print('{:<10} {:>8}'.format(kind, count))
+
+
+@manager.command
+def rebuild_category_paths():
+    """Recompute the materialized path and lineage of every category."""
+    from puppy.models import Category
+    print('Rebuilt {} categories'.format(Category.rebuild_paths()))
+
+
+@manager.command
+def backfill_unread_counts():
+    """Recompute every user's unread notification counter; run once after deploying the column."""
+    from puppy.models import User
+    updated = User.refresh_unread_counts(drifted_only=True)
+    db.session.commit()
+    print('Corrected {} users'.format(updated))
+
+
+@manager.command
+def reconcile_counts():
+    """Correct skill and group counters that drifted from their association tables."""
+    from puppy.models import refresh_counts
+    skills, groups = refresh_counts(db.session, drifted_only=True)
+    db.session.commit()
+    print('Corrected {} skills and {} groups'.format(skills, groups))
+
+
+@manager.option('-n', '--name', dest='names', action='append',
+                help='Benchmark to run, may be given more than once (default: all)')
+@manager.option('-m', '--memory', dest='memory', action='store_true', default=False,
+                help='Use an in-memory database instead of a temporary file')
+@manager.option('-s', '--save-baseline', dest='save', action='store_true', default=False,
+                help='Record these results as the new baseline')
+def benchmark(names=None, memory=False, save=False):
+    """Run the benchmarks against a throwaway SQLite database."""
+    import sys
+    import benchmarks
+    regressions = benchmarks.run(names, memory=memory, save=save)
+    if regressions:
+        print('{} regressions against the baseline'.format(len(regressions)))
+        sys.exit(1)
+
+
 if __name__ == '__main__':
     manager.run()
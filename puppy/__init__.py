@@ -1,13 +1,35 @@
+import os
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.contrib.fixers import ProxyFix
 from flask_bootstrap import Bootstrap
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from config import config
+from .assets import Assets
+from .cache import TTLCache
+from .hashing import PasswordHasher
+from .instrumentation import QueryTracker
+from .metrics import Metrics
+from .pagecache import PageCache
+from .ratelimit import RateLimiter
+from .tokens import TokenAuthority
+from .tracking import LastSeenTracker
 
 bootstrap = Bootstrap()
 moment = Moment()
 db = SQLAlchemy()
+last_seen_tracker = LastSeenTracker()
+identity_cache = TTLCache(config_prefix='IDENTITY_CACHE')
+group_cache = TTLCache(config_prefix='GROUP_CACHE')
+password_hasher = PasswordHasher()
+rate_limiter = RateLimiter()
+token_authority = TokenAuthority()
+query_tracker = QueryTracker()
+page_cache = PageCache()
+assets = Assets()
+metrics = Metrics()
 
 login_manager = LoginManager()
 login_manager.session_protection = 'strong'
@@ -19,10 +41,29 @@ def create_app(config_name):
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
 
+    if app.config['PROXY_COUNT']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, num_proxies=app.config['PROXY_COUNT'])
+
+    # Must be set before anything touches app.jinja_env.
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_options = dict(app.jinja_options,
+                                 bytecode_cache=FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR']))
+
     bootstrap.init_app(app)
     moment.init_app(app)
     db.init_app(app)
     login_manager.init_app(app)
+    last_seen_tracker.init_app(app)
+    identity_cache.init_app(app)
+    group_cache.init_app(app)
+    password_hasher.init_app(app)
+    rate_limiter.init_app(app)
+    token_authority.init_app(app)
+    query_tracker.init_app(app)
+    page_cache.init_app(app)
+    assets.init_app(app)
+    metrics.init_app(app)
 
     from .main import main as main_blueprint
     app.register_blueprint(main_blueprint)
@@ -33,4 +74,7 @@ def create_app(config_name):
     from .meetups import meetups as meetups_blueprint
     app.register_blueprint(meetups_blueprint, url_prefix='/meetups')
 
+    from .api import api as api_blueprint
+    app.register_blueprint(api_blueprint, url_prefix='/api/v1')
+
     return app
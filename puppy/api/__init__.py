@@ -0,0 +1,6 @@
+from flask import Blueprint
+
+api = Blueprint('api', __name__)
+
+from . import authentication, counts, errors, matching, members, moderation, notifications, search, \
+    ventures
@@ -0,0 +1,29 @@
+from flask import g, jsonify, current_app
+from flask.ext.login import current_user
+from . import api
+from .. import db
+from .errors import unauthorized
+
+
+# API requests authenticate with the session cookie or with an
+# "Authorization: Bearer <token>" header (see models.load_user_from_request).
+@api.before_request
+def before_request():
+    if not current_user.is_authenticated:
+        return unauthorized('Authentication required')
+
+
+@api.route('/tokens/', methods=['POST'])
+def get_token():
+    if g.get('token_used'):
+        return unauthorized('A token cannot be used to request a new token')
+    expiration = current_app.config['AUTH_TOKEN_EXPIRATION']
+    return jsonify({'token': current_user.generate_auth_token(expiration),
+                    'expiration': expiration})
+
+
+@api.route('/tokens/', methods=['DELETE'])
+def revoke_tokens():
+    current_user.revoke_auth_tokens()
+    db.session.commit()
+    return jsonify({'revoked': True})
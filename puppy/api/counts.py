@@ -0,0 +1,28 @@
+from flask import jsonify, request, current_app
+from . import api
+from .. import query_tracker
+from ..exceptions import ValidationError
+from ..models import Skill, Group
+
+
+def ids_from_request():
+    ids = request.args.getlist('id', type=int)
+    if len(ids) > current_app.config['API_PAGE_SIZE_MAX']:
+        raise ValidationError('At most {} ids per request'.format(current_app.config['API_PAGE_SIZE_MAX']))
+    return ids
+
+
+@api.route('/skills/counts')
+@query_tracker.budget(3)
+def get_skill_counts():
+    counts = Skill.counts(ids_from_request())
+    return jsonify({'counts': [{'id': skill_id, 'user_count': user_count, 'category_count': category_count}
+                               for skill_id, (user_count, category_count) in sorted(counts.items())]})
+
+
+@api.route('/groups/counts')
+@query_tracker.budget(3)
+def get_group_counts():
+    counts = Group.counts(ids_from_request())
+    return jsonify({'counts': [{'id': group_id, 'user_count': user_count}
+                               for group_id, user_count in sorted(counts.items())]})
@@ -0,0 +1,20 @@
+from flask import jsonify, current_app, abort
+from . import api
+from .ventures import visible
+from .. import query_tracker
+from ..models import Venture
+from ..pagination import page_limit
+
+
+@api.route('/ventures/<int:id>/matches')
+@query_tracker.budget(8)
+def get_venture_matches(id):
+    # numpy and scipy are only loaded once matches are first asked for.
+    from ..matching import skill_matcher
+    venture = Venture.query.get(id)
+    if venture is None or not visible(venture):
+        abort(404)
+    matches = skill_matcher.match_venture(id, page_limit(current_app.config['MATCHING_RESULTS']))
+    return jsonify({'matches': [{'user_id': match.user_id,
+                                 'score': match.score,
+                                 'skill_ids': match.skill_ids} for match in matches]})
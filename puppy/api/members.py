@@ -0,0 +1,63 @@
+from flask import jsonify, request, url_for
+from flask.ext.login import current_user
+from . import api
+from .errors import forbidden
+from .. import db, query_tracker
+from ..exceptions import ValidationError
+from ..models import User, user_skills
+from ..pagination import keyset_paginate, page_limit, parse_timestamp
+
+# Orderings of the directory; each is backed by an index ending in (column, id).
+SORTS = {
+    'registered_on': User.registered_on,
+    'last_seen': User.last_seen,
+}
+
+
+@api.route('/members/')
+@query_tracker.budget(3)
+def get_members():
+    """The member directory, newest first.
+
+    Only approved members may read it, and they only see other approved
+    members; administrators see everyone and may filter on ``approved`` (0
+    or 1).  Filters: ``location``, ``active_since`` (an ISO 8601 timestamp
+    compared with ``last_seen``) and ``skill`` (a skill id).  ``sort`` is
+    ``registered_on`` (the default) or ``last_seen``.
+    """
+    if not (current_user.approved or current_user.is_administrator):
+        return forbidden('Your membership has not been approved yet')
+    limit = page_limit()
+    sort = request.args.get('sort', 'registered_on')
+    if sort not in SORTS:
+        raise ValidationError('sort must be one of: {}'.format(', '.join(sorted(SORTS))))
+    # Rows without a sort key could never be reached by a cursor.
+    query = User.query.filter(SORTS[sort].isnot(None))
+    location = request.args.get('location')
+    if location:
+        query = query.filter(User.location == location)
+    approved = None
+    if current_user.is_administrator:
+        approved = request.args.get('approved', type=int)
+        if approved is not None:
+            query = query.filter(User.approved == bool(approved))
+    else:
+        query = query.filter(User.approved == True, User.rejected_on.is_(None))
+    active_since = request.args.get('active_since')
+    if active_since:
+        query = query.filter(User.last_seen >= parse_timestamp(active_since, 'active_since'))
+    skill = request.args.get('skill', type=int)
+    if skill is not None:
+        # (user_id, skill_id) is unique, so the join cannot repeat a member.
+        query = query.join(user_skills, db.and_(user_skills.c.user_id == User.id,
+                                                user_skills.c.skill_id == skill))
+    page = keyset_paginate(query, [SORTS[sort], User.id], cursor=request.args.get('cursor'), limit=limit)
+    next_url = None
+    if page.next_cursor:
+        next_url = url_for('api.get_members', cursor=page.next_cursor, limit=limit, sort=sort,
+                           location=location, approved=approved, active_since=active_since,
+                           skill=skill, _external=True)
+    return jsonify({
+        'members': [user.to_directory_json() for user in page.items],
+        'next': next_url,
+    })
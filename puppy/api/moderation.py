@@ -0,0 +1,75 @@
+from flask import jsonify, request, url_for
+from flask.ext.login import current_user
+from . import api
+from .. import query_tracker
+from ..decorators import admin_required
+from ..exceptions import ValidationError
+from ..moderation import queue, pending_counts, moderate, MODERATED
+from ..pagination import page_limit
+
+
+@api.route('/moderation/')
+@admin_required
+@query_tracker.budget(3)
+def get_moderation_queue():
+    limit = page_limit()
+    kinds = request.args.getlist('kind') or None
+    page = queue(kinds, cursor=request.args.get('cursor'), limit=limit)
+    next_url = None
+    if page.next_cursor:
+        next_url = url_for('api.get_moderation_queue', cursor=page.next_cursor, limit=limit,
+                           kind=kinds, _external=True)
+    return jsonify({
+        'items': [{'kind': item.kind,
+                   'id': item.id,
+                   'title': item.title,
+                   'submitted_on': str(item.submitted_on),
+                   'submitted_by': item.submitted_by} for item in page.items],
+        'next': next_url,
+    })
+
+
+@api.route('/moderation/counts')
+@admin_required
+@query_tracker.budget(3)
+def get_moderation_counts():
+    return jsonify({'pending': pending_counts()})
+
+
+def selection_from_request():
+    """Read the ``{kind: [id, ...]}`` selection and optional ``reason`` of a bulk request."""
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValidationError('The request body must be a JSON object')
+    selection = {}
+    for kind in MODERATED:
+        ids = data.get(kind)
+        if ids is None:
+            continue
+        if not (isinstance(ids, list) and all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            raise ValidationError('{} must be a list of ids'.format(kind))
+        selection[kind] = ids
+    reason = data.get('reason')
+    if reason is not None and not isinstance(reason, str):
+        raise ValidationError('reason must be a string')
+    return selection, reason
+
+
+# Per kind: one UPDATE; then one SELECT of the changed rows, the notification
+# insert and the unread count update.
+@api.route('/moderation/approve', methods=['POST'])
+@admin_required
+@query_tracker.budget(10)
+def approve_items():
+    selection, reason = selection_from_request()
+    return jsonify({'approved': moderate(selection, current_user.id, approve=True, reason=reason)})
+
+
+@api.route('/moderation/reject', methods=['POST'])
+@admin_required
+@query_tracker.budget(10)
+def reject_items():
+    selection, reason = selection_from_request()
+    return jsonify({'rejected': moderate(selection, current_user.id, approve=False, reason=reason)})
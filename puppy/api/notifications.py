@@ -0,0 +1,74 @@
+from flask import jsonify, request, url_for
+from flask.ext.login import current_user
+from . import api
+from .. import db, query_tracker
+from ..exceptions import ValidationError
+from ..models import Notification
+from ..pagination import keyset_paginate, page_limit, parse_timestamp
+
+
+@api.route('/notifications/')
+@query_tracker.budget(4)
+def get_notifications():
+    limit = page_limit()
+    query = Notification.query.filter_by(sent_to=current_user.id) \
+                              .options(db.joinedload('created_by_user'),
+                                       db.joinedload('sent_to_user'))
+    if request.args.get('unread', 0, type=int):
+        query = query.filter(Notification.read_on.is_(None))
+    page = keyset_paginate(query, [Notification.created_on, Notification.id],
+                           cursor=request.args.get('cursor'), limit=limit)
+    next_url = None
+    if page.next_cursor:
+        next_url = url_for('api.get_notifications', cursor=page.next_cursor, limit=limit,
+                           unread=request.args.get('unread'), _external=True)
+    return jsonify({
+        'notifications': [notification.to_json() for notification in page.items],
+        'next': next_url,
+        'unread_count': current_user.fetch_unread_count(),
+    })
+
+
+@api.route('/notifications/unread-count')
+@query_tracker.budget(3)
+def get_unread_count():
+    return jsonify({'unread_count': current_user.fetch_unread_count()})
+
+
+def selection_from_request():
+    """Read the ``ids`` list and/or ``before`` timestamp of a bulk request.
+
+    A request naming neither must say ``"all": true``, so an empty or
+    malformed body cannot select everything.
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        raise ValidationError('The request body must be a JSON object')
+    ids = data.get('ids')
+    if ids is not None and not (isinstance(ids, list) and
+                                all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+        raise ValidationError('ids must be a list of notification ids')
+    before = data.get('before')
+    if before is not None:
+        before = parse_timestamp(before, 'before')
+    if ids is None and before is None and data.get('all') is not True:
+        raise ValidationError('Give ids and/or before, or "all": true to select every notification')
+    return ids, before
+
+
+@api.route('/notifications/mark-read', methods=['POST'])
+@query_tracker.budget(6)
+def mark_notifications_read():
+    ids, before = selection_from_request()
+    marked = Notification.bulk_mark_read(current_user.id, ids=ids, before=before)
+    return jsonify({'marked_read': marked, 'unread_count': current_user.fetch_unread_count()})
+
+
+@api.route('/notifications/', methods=['DELETE'])
+@query_tracker.budget(9)
+def delete_notifications():
+    ids, before = selection_from_request()
+    deleted = Notification.bulk_delete(current_user.id, ids=ids, before=before)
+    return jsonify({'deleted': deleted, 'unread_count': current_user.fetch_unread_count()})
@@ -0,0 +1,17 @@
+from flask import jsonify, request, current_app
+from . import api
+from .. import query_tracker
+from ..pagination import page_limit
+from ..search import search_index
+
+
+@api.route('/search')
+@query_tracker.budget(3)
+def search():
+    kinds = request.args.getlist('kind') or None
+    limit = page_limit(current_app.config['SEARCH_RESULTS'])
+    results = search_index.search(request.args.get('q', ''), kinds=kinds, limit=limit)
+    return jsonify({'results': [{'kind': result.kind,
+                                 'id': result.id,
+                                 'title': result.title,
+                                 'rank': result.rank} for result in results]})
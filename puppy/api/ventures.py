@@ -0,0 +1,47 @@
+from flask import jsonify, request, url_for, abort
+from flask.ext.login import current_user
+from . import api
+from .. import db, query_tracker
+from ..models import Venture
+from ..pagination import keyset_paginate, page_limit
+
+
+def published():
+    """Criteria of the ventures anyone may see: approved and not rejected."""
+    return [Venture.approved_on.isnot(None), Venture.rejected_on.is_(None)]
+
+
+def visible(venture):
+    """True if the caller may see ``venture``; unpublished ones are for their creator and administrators."""
+    return (venture.approved_on is not None and venture.rejected_on is None) or \
+        venture.created_by == current_user.id or current_user.is_administrator
+
+
+@api.route('/ventures/')
+@query_tracker.budget(5)
+def get_ventures():
+    limit = page_limit()
+    query = Venture.query.options(db.joinedload('created_by_user'))
+    # Administrators may ask for pending and rejected ventures too.
+    include_all = bool(request.args.get('all', 0, type=int)) and current_user.is_administrator
+    if not include_all:
+        query = query.filter(*published())
+    page = keyset_paginate(query, [Venture.created_on, Venture.id],
+                           cursor=request.args.get('cursor'), limit=limit)
+    next_url = None
+    if page.next_cursor:
+        next_url = url_for('api.get_ventures', cursor=page.next_cursor, limit=limit,
+                           all=1 if include_all else None, _external=True)
+    return jsonify({
+        'ventures': Venture.details_to_json(page.items),
+        'next': next_url,
+    })
+
+
+@api.route('/ventures/<int:id>')
+@query_tracker.budget(5)
+def get_venture(id):
+    venture = Venture.query.options(db.joinedload('created_by_user')).filter_by(id=id).first()
+    if venture is None or not visible(venture):
+        abort(404)
+    return jsonify(Venture.details_to_json([venture])[0])
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+OUTPUT_FOLDER = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.ico', '.json', '.txt', '.html', '.map')
+# Fingerprinted URLs change with their content, so they can be cached forever.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def build_assets(static_folder):
+    """Copy every static file to ``dist/`` under a content-hashed name.
+
+    Compressible files also get ``.br`` and ``.gz`` variants.  The mapping
+    from source to fingerprinted name and the available encodings are
+    written to ``dist/manifest.json``.
+    """
+    # Only needed at build time, so kept out of the application's imports.
+    import brotli
+    output = os.path.join(static_folder, OUTPUT_FOLDER)
+    shutil.rmtree(output, ignore_errors=True)
+    manifest = {'assets': {}, 'encodings': {}}
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != output)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            base, ext = os.path.splitext(relative)
+            fingerprinted = '{}/{}.{}{}'.format(OUTPUT_FOLDER, base, hashlib.md5(data).hexdigest()[:12], ext)
+            target = os.path.join(static_folder, *fingerprinted.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            manifest['assets'][relative] = fingerprinted
+            if ext.lower() not in COMPRESSIBLE:
+                continue
+            variants = [('br', '.br', brotli.compress(data)), ('gzip', '.gz', gzip.compress(data, 9))]
+            encodings = []
+            for encoding, suffix, compressed in variants:
+                if len(compressed) < len(data):
+                    with open(target + suffix, 'wb') as f:
+                        f.write(compressed)
+                    encodings.append(encoding)
+            if encodings:
+                manifest['encodings'][fingerprinted] = encodings
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class Assets(object):
+    """Serve the fingerprinted assets written by ``build_assets``.
+
+    ``url_for('static', filename=...)`` is rewritten to the fingerprinted name
+    when the manifest knows the file, and those files are served with a far
+    future ``Cache-Control`` and a precompressed variant matching the
+    request's ``Accept-Encoding``.  Without a manifest nothing changes.
+    """
+
+    suffixes = {'br': '.br', 'gzip': '.gz'}
+
+    def __init__(self, app=None):
+        self.manifest = {'assets': {}, 'encodings': {}}
+        self.fingerprinted = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        path = os.path.join(app.static_folder, OUTPUT_FOLDER, MANIFEST)
+        if os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+            self.fingerprinted = set(self.manifest['assets'].values())
+        app.url_defaults(self._fingerprint)
+        app.view_functions['static'] = self.send_static_file
+
+    def _fingerprint(self, endpoint, values):
+        if endpoint == 'static':
+            filename = self.manifest['assets'].get(values.get('filename'))
+            if filename is not None:
+                values['filename'] = filename
+
+    def send_static_file(self, filename):
+        if filename not in self.fingerprinted:
+            return current_app.send_static_file(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding in self.manifest['encodings'].get(filename, ()):
+            if request.accept_encodings[encoding] > 0:
+                response = send_from_directory(current_app.static_folder, filename + self.suffixes[encoding],
+                                               mimetype=mimetype, conditional=True)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(current_app.static_folder, filename,
+                                           mimetype=mimetype, conditional=True)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
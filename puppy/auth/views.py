@@ -2,7 +2,7 @@ from flask import render_template, redirect, request, url_for, flash
 from flask.ext.login import login_user, logout_user, login_required, current_user, current_app
 from datetime import datetime
 from . import auth
-from .. import db
+from .. import db, rate_limiter
 from ..models import User, Group
 from .forms import LoginForm, RegistrationForm, ChangePasswordForm,\
     PasswordResetRequestForm, PasswordResetForm, ChangeEmailForm
@@ -26,12 +26,14 @@ def unconfirmed():
 
 
 @auth.route('/login', methods=['GET', 'POST'])
+@rate_limiter.limit('login')
 def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user is not None and user.verify_password(form.password.data):
             login_user(user, form.remember_me.data)
+            db.session.commit()
             return redirect(request.args.get('next') or url_for('main.index'))
         flash('Invalid username or password.')
     return render_template('auth/login.html', form=form)
@@ -46,6 +48,7 @@ def logout():
 
 
 @auth.route('/register', methods=['GET', 'POST'])
+@rate_limiter.limit('register')
 def register():
     form = RegistrationForm()
     if form.validate_on_submit():
@@ -61,7 +64,7 @@ def register():
         # send_email(user.email, 'Confirm Your Account',
         #            'auth/email/confirm', user=user, token=token)
         flash('A confirmation email has been sent to you by email.')
-        user.send_message(Group.get_admin_users(),
+        user.send_message(Group.get_admin_user_ids(),
                           'New User Registered',
                           'A new user [%s] has registered.' % (user.email))
         return redirect(url_for('auth.login'))
@@ -106,6 +109,7 @@ def change_password():
 
 
 @auth.route('/reset', methods=['GET', 'POST'])
+@rate_limiter.limit('password_reset')
 def password_reset_request():
     if not current_user.is_anonymous:
         return redirect(url_for('main.index'))
@@ -125,6 +129,7 @@ def password_reset_request():
 
 
 @auth.route('/reset/<token>', methods=['GET', 'POST'])
+@rate_limiter.limit('password_reset')
 def password_reset(token):
     if not current_user.is_anonymous:
         return redirect(url_for('main.index'))
@@ -143,6 +148,7 @@ def password_reset(token):
 
 @auth.route('/change-email', methods=['GET', 'POST'])
 @login_required
+@rate_limiter.limit('change_email')
 def change_email_request():
     form = ChangeEmailForm()
     if form.validate_on_submit():
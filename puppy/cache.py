@@ -0,0 +1,59 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """A thread-safe, size-bounded LRU mapping whose entries expire after ``ttl`` seconds.
+
+    When ``config_prefix`` is given, ``init_app`` reads the size and the TTL
+    from the ``<prefix>_SIZE`` and ``<prefix>_TTL`` configuration keys.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, config_prefix=None, app=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.config_prefix = config_prefix
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.config_prefix:
+            self.maxsize = app.config[self.config_prefix + '_SIZE']
+            self.ttl = app.config[self.config_prefix + '_TTL']
+        self.clear()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.data[key]
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.data[key] = (expires, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
@@ -0,0 +1,26 @@
+from functools import wraps
+from flask import abort, request
+from flask.ext.login import current_user
+from .models import Group
+
+
+def groups_required(*group_list, require_all=False):
+    """Abort with 403 unless the current user is in one (or all) of the groups.
+
+    API views get the API's JSON error body instead of the HTML error page.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.in_groups(group_list, require_all=require_all):
+                if request.blueprint == 'api':
+                    from .api.errors import forbidden
+                    return forbidden('Insufficient permissions')
+                abort(403)
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def admin_required(f):
+    return groups_required(*Group.administrative_groups)(f)
@@ -0,0 +1,2 @@
+class ValidationError(ValueError):
+    """Invalid input in an API request; answered with a 400."""
@@ -0,0 +1,117 @@
+import fcntl
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingOverloaded(Exception):
+    """Every hashing slot stayed busy for longer than PASSWORD_HASH_QUEUE_TIMEOUT."""
+
+
+class HostSlots(object):
+    """A counting semaphore shared by every process on the host.
+
+    Each slot is a file in ``directory`` held with a POSIX record lock.
+    Those locks belong to the process, so they are released if it dies and
+    are not inherited by forked children.  A thread lock per slot keeps
+    threads of one process from sharing a slot.
+    """
+
+    poll = 0.005
+
+    def __init__(self, directory, size):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, 'slot-{}'.format(i)) for i in range(size)]
+        self.locks = [threading.Lock() for _ in self.paths]
+        self.files = None
+        self.pid = None
+
+    def _files(self):
+        # Closing any descriptor of a file drops the process's lock on it, so
+        # each process keeps one descriptor per slot open for its lifetime.
+        if self.pid != os.getpid():
+            self.files = [os.open(path, os.O_RDWR | os.O_CREAT, 0o600) for path in self.paths]
+            self.pid = os.getpid()
+        return self.files
+
+    def acquire(self, timeout):
+        """Return the index of a free slot, or None after ``timeout`` seconds."""
+        files = self._files()
+        deadline = time.time() + timeout
+        while True:
+            for slot, lock in enumerate(self.locks):
+                if not lock.acquire(False):
+                    continue
+                try:
+                    fcntl.lockf(files[slot], fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock.release()
+                    continue
+                return slot
+            if time.time() >= deadline:
+                return None
+            time.sleep(self.poll)
+
+    def release(self, slot):
+        fcntl.lockf(self.files[slot], fcntl.LOCK_UN)
+        self.locks[slot].release()
+
+
+class PasswordHasher(object):
+    """Run password hashing in a bounded process pool.
+
+    At most ``PASSWORD_HASH_MAX_CONCURRENT`` hashes run at once across all
+    worker processes on the host, counted with the lock files in
+    ``PASSWORD_HASH_SLOTS``; a request that cannot get a slot within
+    ``PASSWORD_HASH_QUEUE_TIMEOUT`` seconds fails fast with
+    ``HashingOverloaded`` instead of queueing.  With
+    ``PASSWORD_HASH_WORKERS = 0`` hashes are computed inline.
+    """
+
+    def __init__(self, app=None):
+        self.executor = None
+        self.executor_pid = None
+        self.lock = threading.Lock()
+        self.slots = None
+        self.rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.timeout = app.config['PASSWORD_HASH_QUEUE_TIMEOUT']
+        self.slots = HostSlots(app.config['PASSWORD_HASH_SLOTS'], app.config['PASSWORD_HASH_MAX_CONCURRENT'])
+
+    def _executor(self):
+        # Created on first use so that every forked worker gets its own pool.
+        with self.lock:
+            if self.executor is None or self.executor_pid != os.getpid():
+                self.executor = ProcessPoolExecutor(self.workers)
+                self.executor_pid = os.getpid()
+            return self.executor
+
+    def _run(self, func, *args):
+        slot = self.slots.acquire(self.timeout)
+        if slot is None:
+            self.rejected += 1
+            raise HashingOverloaded()
+        try:
+            if not self.workers:
+                return func(*args)
+            return self._executor().submit(func, *args).result()
+        finally:
+            self.slots.release(slot)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if ``pwhash`` was not made with the configured method and cost."""
+        return pwhash.split('$', 1)[0] != self.method
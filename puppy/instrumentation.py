@@ -0,0 +1,100 @@
+import json
+import re
+import time
+from collections import Counter
+
+from flask import current_app, request, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def statement_shape(statement):
+    """Reduce a statement to its shape: placeholders and IN lists collapsed."""
+    shape = re.sub(r'%\(\w+\)s|:\w+', '?', statement)
+    shape = re.sub(r'\?(\s*,\s*\?)+', '?', shape)
+    return ' '.join(shape.split())
+
+
+class QueryTracker(object):
+    """Per-request SQL instrumentation.
+
+    Counts the statements each request sends, the time spent in the
+    database and how often each statement shape repeats.  The totals are
+    sent back in a ``Server-Timing`` header and logged as JSON; a shape
+    repeated ``SQL_NPLUSONE_THRESHOLD`` times or more is logged as a likely
+    N+1.  A request over its query budget (``@query_tracker.budget(n)`` on
+    the view, else ``SQL_QUERY_BUDGET``) is logged, and raises
+    ``QueryBudgetExceeded`` when ``SQL_STRICT`` is set, as it is for tests.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['SQL_INSTRUMENTATION']:
+            return
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def budget(self, queries):
+        def decorator(f):
+            f.query_budget = queries
+            return f
+        return decorator
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+        if not has_request_context():
+            return
+        stats = g.get('sql_stats')
+        if stats is not None:
+            stats['queries'] += 1
+            stats['seconds'] += elapsed
+            stats['shapes'][statement_shape(statement)] += 1
+
+    def _start(self):
+        g.sql_stats = {'queries': 0, 'seconds': 0.0, 'shapes': Counter(), 'started': time.perf_counter()}
+
+    def _finish(self, response):
+        stats = g.get('sql_stats')
+        if stats is None:
+            return response
+        config = current_app.config
+        db_ms = stats['seconds'] * 1000
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        response.headers.add('Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(db_ms, stats['queries']))
+        response.headers.add('Server-Timing', 'app;dur={:.2f}'.format(total_ms))
+        repeated = dict((shape, count) for shape, count in stats['shapes'].items()
+                        if count >= config['SQL_NPLUSONE_THRESHOLD'])
+        current_app.logger.info(json.dumps({
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats['queries'],
+            'db_ms': round(db_ms, 2),
+            'total_ms': round(total_ms, 2),
+            'repeated': repeated,
+        }, sort_keys=True))
+        for shape, count in repeated.items():
+            current_app.logger.warning('Possible N+1 in %s: %d x %s', request.endpoint, count, shape)
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', config['SQL_QUERY_BUDGET'])
+        if budget is not None and stats['queries'] > budget:
+            message = '{} issued {} queries, over its budget of {}'.format(
+                request.endpoint, stats['queries'], budget)
+            current_app.logger.warning(message)
+            if config['SQL_STRICT']:
+                raise QueryBudgetExceeded(message)
+        return response
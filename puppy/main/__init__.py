@@ -1,5 +1,17 @@
 from flask import Blueprint
+from flask.ext.login import current_user
 
 main = Blueprint('main', __name__)
 
 from . import views, errors
+
+
+def in_groups(*group_list, require_all=False):
+    return current_user.in_groups(group_list, require_all=require_all)
+
+
+@main.app_context_processor
+def inject_permissions():
+    # Membership is resolved once per request on the loaded user, so calling
+    # these from templates does not add queries.
+    return dict(in_groups=in_groups)
@@ -1,5 +1,7 @@
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, make_response
 from . import main
+from ..hashing import HashingOverloaded
+from ..ratelimit import RateLimitExceeded
 
 
 @main.app_errorhandler(403)
@@ -30,3 +32,27 @@ def internal_server_error(e):
         response.status_code = 500
         return response
     return render_template('500.html'), 500
+
+
+@main.app_errorhandler(RateLimitExceeded)
+def too_many_requests(e):
+    if request.accept_mimetypes.accept_json and \
+            not request.accept_mimetypes.accept_html:
+        response = jsonify({'error': 'too many requests'})
+        response.status_code = 429
+    else:
+        response = make_response(render_template('429.html'), 429)
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+@main.app_errorhandler(HashingOverloaded)
+def service_unavailable(e):
+    if request.accept_mimetypes.accept_json and \
+            not request.accept_mimetypes.accept_html:
+        response = jsonify({'error': 'service unavailable'})
+        response.status_code = 503
+    else:
+        response = make_response(render_template('503.html'), 503)
+    response.headers['Retry-After'] = '5'
+    return response
@@ -1,8 +1,10 @@
 from flask import render_template
 from . import main
+from .. import page_cache
 
 
 @main.route('/')
+@page_cache.cached(300)
 def index():
     welcome_title = "Welcome to PuPPy!"
     welcome_text = """
@@ -17,15 +19,18 @@ def index():
 
 
 @main.route('/about')
+@page_cache.cached(3600)
 def about():
     return render_template('index.html')
 
 
 @main.route('/contact')
+@page_cache.cached(3600)
 def contact():
     return render_template('index.html')
 
 
 @main.route('/sponsers')
+@page_cache.cached(3600)
 def sponsers():
     return render_template('index.html')
@@ -0,0 +1,222 @@
+"""Match members to the skills a venture is missing.
+
+The ``user_skill`` table is held in memory as a sparse users x skills
+matrix.  A venture's needs become a weight per skill: full weight for the
+skills it asks for, and ``MATCHING_PROXIMITY_WEIGHT`` times their category
+proximity for related skills, where two categories are as close as the share
+of their materialized paths they have in common.  Every member is then scored
+with one sparse matrix-vector product and the top ``k`` are selected with a
+partial sort.
+
+Skill changes made through the ORM in this process are applied to the matrix
+incrementally once their transaction commits.  Changes made by other workers
+or with Core statements are picked up by the full rebuild that runs every
+``MATCHING_REFRESH_INTERVAL`` seconds.
+"""
+import threading
+import time
+from collections import namedtuple
+from itertools import chain
+
+import numpy as np
+from scipy import sparse
+from flask import current_app
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event
+
+from . import db
+from .models import User, Skill, Category, VentureSkill, Venture, skills_category, user_skills
+
+Match = namedtuple('Match', ['user_id', 'score', 'skill_ids'])
+
+
+class SkillMatrix(object):
+    """The users x skills incidence plus the skill proximity data derived from categories."""
+
+    def __init__(self):
+        skill_ids = np.array([skill_id for (skill_id,) in db.session.query(Skill.id).order_by(Skill.id)],
+                             dtype=np.int64)
+        self.skill_ids = skill_ids
+        self.skill_index = dict((skill_id, i) for i, skill_id in enumerate(skill_ids.tolist()))
+
+        # Joined so that rows with a missing or dangling user or skill are left out.
+        rows = db.session.execute(db.select([user_skills.c.user_id, user_skills.c.skill_id])
+                                  .select_from(user_skills.join(User.__table__, User.id == user_skills.c.user_id)
+                                                          .join(Skill.__table__, Skill.id == user_skills.c.skill_id)))
+        pairs = np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+        self.user_ids, user_rows = np.unique(pairs[:, 0], return_inverse=True)
+        self.user_index = dict((user_id, i) for i, user_id in enumerate(self.user_ids.tolist()))
+        skill_cols = np.searchsorted(skill_ids, pairs[:, 1])
+        self.users = sparse.csr_matrix((np.ones(len(pairs)), (user_rows, skill_cols)),
+                                       shape=(len(self.user_ids), len(skill_ids)))
+        self.users.data[:] = 1
+        self._build_proximity()
+
+    def _build_proximity(self):
+        categories = db.session.query(Category.id, Category.path).order_by(Category.id).all()
+        category_ids = np.array([category_id for category_id, _ in categories], dtype=np.int64)
+        category_index = dict((category_id, i) for i, category_id in enumerate(category_ids.tolist()))
+        # Ancestor-or-self incidence from the materialized paths.
+        rows, cols = [], []
+        for i, (category_id, path) in enumerate(categories):
+            ancestors = [int(part) for part in (path or '/{}/'.format(category_id)).strip('/').split('/')]
+            for ancestor in ancestors:
+                if ancestor in category_index:
+                    rows.append(i)
+                    cols.append(category_index[ancestor])
+        n = len(category_ids)
+        ancestry = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+        depth = np.asarray(ancestry.sum(axis=1)).ravel()
+        shared = ancestry.dot(ancestry.T).tocoo()
+        self.category_proximity = sparse.csr_matrix(
+            (shared.data / np.maximum(depth[shared.row], depth[shared.col]), (shared.row, shared.col)),
+            shape=(n, n))
+
+        links = [(self.skill_index[skill_id], category_index[category_id])
+                 for skill_id, category_id in db.session.execute(
+                     db.select([skills_category.c.skill_id, skills_category.c.category_id]))
+                 if skill_id in self.skill_index and category_id in category_index]
+        self.skill_categories = sparse.csr_matrix(
+            (np.ones(len(links)), ([s for s, _ in links], [c for _, c in links])),
+            shape=(len(self.skill_ids), n))
+        self.categories_per_skill = np.maximum(np.asarray(self.skill_categories.sum(axis=1)).ravel(), 1)
+
+    def apply(self, changes):
+        """Apply ``(user_id, skill_id, delta)`` changes; returns False if a rebuild is needed."""
+        if any(skill_id is not None and skill_id not in self.skill_index for _, skill_id, _ in changes):
+            return False
+        new_users = sorted(set(user_id for user_id, _, _ in changes) - set(self.user_index))
+        if new_users:
+            for user_id in new_users:
+                self.user_index[user_id] = len(self.user_index)
+            self.user_ids = np.concatenate([self.user_ids, np.array(new_users, dtype=np.int64)])
+            indptr = np.concatenate([self.users.indptr, np.repeat(self.users.indptr[-1], len(new_users))])
+            self.users = sparse.csr_matrix((self.users.data, self.users.indices, indptr),
+                                           shape=(len(self.user_ids), len(self.skill_ids)))
+        rows, cols, values = [], [], []
+        for user_id, skill_id, delta in changes:
+            row = self.user_index[user_id]
+            if skill_id is None:
+                # The user is gone: clear the whole row.
+                start, end = self.users.indptr[row], self.users.indptr[row + 1]
+                self.users.data[start:end] = 0
+            else:
+                rows.append(row)
+                cols.append(self.skill_index[skill_id])
+                values.append(delta)
+        if rows:
+            delta = sparse.csr_matrix((values, (rows, cols)), shape=self.users.shape)
+            self.users = self.users + delta
+            np.clip(self.users.data, 0, 1, out=self.users.data)
+        self.users.eliminate_zeros()
+        return True
+
+    def weights(self, need, proximity_weight):
+        """Skill weights for a need vector: exact skills plus category neighbours."""
+        related = self.skill_categories.dot(self.category_proximity.dot(self.skill_categories.T.dot(need)))
+        return need + proximity_weight * related / self.categories_per_skill
+
+    def top(self, skill_ids, exclude_user_ids=(), k=10, proximity_weight=0.5):
+        need = np.zeros(len(self.skill_ids))
+        for skill_id in skill_ids:
+            if skill_id in self.skill_index:
+                need[self.skill_index[skill_id]] += 1
+        if not need.any() or not len(self.user_ids):
+            return []
+        scores = self.users.dot(self.weights(need, proximity_weight))
+        for user_id in exclude_user_ids:
+            if user_id in self.user_index:
+                scores[self.user_index[user_id]] = 0
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='mergesort')]
+        needed = need > 0
+        return [Match(int(self.user_ids[row]), round(float(scores[row]), 4),
+                      self.skill_ids[self.users[row].indices[needed[self.users[row].indices]]].tolist())
+                for row in best]
+
+
+class SkillMatcher(object):
+    """The current ``SkillMatrix``, built on first use for the current application."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.app = None
+        self.matrix = None
+        self.built = 0
+        self.pending = []
+
+    def invalidate(self):
+        with self.lock:
+            self.matrix = None
+            self.pending = []
+
+    def record(self, changes):
+        with self.lock:
+            if self.matrix is not None:
+                self.pending.extend(changes)
+
+    def current(self):
+        app = current_app._get_current_object()
+        with self.lock:
+            if self.app is not app:
+                self.app, self.matrix = app, None
+            if self.matrix is None or time.monotonic() - self.built > app.config['MATCHING_REFRESH_INTERVAL']:
+                self.matrix, self.built, self.pending = SkillMatrix(), time.monotonic(), []
+            elif self.pending:
+                if not self.matrix.apply(self.pending):
+                    self.matrix, self.built = SkillMatrix(), time.monotonic()
+                self.pending = []
+            return self.matrix
+
+    def match_skills(self, skill_ids, exclude_user_ids=(), limit=None):
+        """Return the best ``Match``es for members with ``skill_ids`` or related skills."""
+        config = current_app.config
+        return self.current().top(skill_ids, exclude_user_ids, limit or config['MATCHING_RESULTS'],
+                                  config['MATCHING_PROXIMITY_WEIGHT'])
+
+    def match_venture(self, venture_id, limit=None):
+        """Rank members for the skills a venture still needs.
+
+        A venture skill without a user is an open need; a venture whose skills
+        are all filled is matched on all of them.  Members already on the
+        venture, and its creator, are left out.
+        """
+        venture = Venture.query.get(venture_id)
+        if venture is None:
+            return None
+        rows = db.session.query(VentureSkill.skill_id, VentureSkill.user_id) \
+                         .filter(VentureSkill.venture_id == venture_id).all()
+        needed = [skill_id for skill_id, user_id in rows if user_id is None] or \
+            [skill_id for skill_id, _ in rows]
+        members = set(user_id for _, user_id in rows if user_id is not None)
+        members.add(venture.created_by)
+        return self.match_skills(needed, members, limit)
+
+
+skill_matcher = SkillMatcher()
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def _collect_skill_changes(session, flush_context):
+    changes = session.info.setdefault('skill_changes', [])
+    for user in session.dirty.union(session.new):
+        if isinstance(user, User):
+            history = db.inspect(user).attrs.skills.history
+            changes.extend((user.id, skill.id, 1) for skill in history.added or ())
+            changes.extend((user.id, skill.id, -1) for skill in history.deleted or ())
+    changes.extend((user.id, None, 0) for user in session.deleted if isinstance(user, User))
+
+
+@event.listens_for(SignallingSession, 'after_commit')
+def _apply_skill_changes(session):
+    changes = session.info.pop('skill_changes', None)
+    if changes:
+        skill_matcher.record(changes)
+
+
+@event.listens_for(SignallingSession, 'after_soft_rollback')
+def _discard_skill_changes(session, previous_transaction):
+    session.info.pop('skill_changes', None)
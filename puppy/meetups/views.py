@@ -1,17 +1,21 @@
 from flask import render_template
 from . import meetups
+from .. import page_cache
 
 
 @meetups.route('/')
+@page_cache.cached(600)
 def index():
     return render_template('index.html')
 
 
 @meetups.route('/monthly')
+@page_cache.cached(600)
 def monthly():
     return render_template('index.html')
 
 
 @meetups.route('/programming-night')
+@page_cache.cached(600)
 def programmingnight():
     return render_template('index.html')
@@ -0,0 +1,190 @@
+import os
+import time
+
+from flask import Response, request, g
+from jinja2 import Template
+from sqlalchemy import event
+
+class _Discard(object):
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+    def set(self, value):
+        pass
+
+
+class LazyMetric(object):
+    """A prometheus_client metric created on first use.
+
+    Metric objects register themselves globally, so they are created once
+    per process rather than once per application, and only once something
+    is recorded, which keeps prometheus_client out of the import path.
+    """
+
+    discard = _Discard()
+    # Set by Metrics.init_app; until an application enables metrics nothing
+    # is recorded and prometheus_client is never imported.
+    recording = False
+
+    def __init__(self, kind, *args, **kwargs):
+        self.kind = kind
+        self.args = args
+        self.kwargs = kwargs
+        self.metric = None
+
+    def _get(self):
+        if not self.recording:
+            return self.discard
+        if self.metric is None:
+            import prometheus_client
+            self.metric = getattr(prometheus_client, self.kind)(*self.args, **self.kwargs)
+        return self.metric
+
+    def labels(self, *args, **kwargs):
+        return self._get().labels(*args, **kwargs)
+
+    def inc(self, amount=1):
+        self._get().inc(amount)
+
+    def observe(self, amount):
+        self._get().observe(amount)
+
+    def set(self, value):
+        self._get().set(value)
+
+
+REQUEST_LATENCY = LazyMetric('Histogram', 'puppy_request_duration_seconds', 'Request latency',
+                             ['endpoint', 'method'])
+REQUEST_COUNT = LazyMetric('Counter', 'puppy_requests_total', 'Requests served',
+                           ['endpoint', 'method', 'status'])
+POOL_CHECKOUTS = LazyMetric('Counter', 'puppy_db_pool_checkouts_total', 'Connections checked out of the pool')
+POOL_WAIT = LazyMetric('Histogram', 'puppy_db_pool_wait_seconds', 'Time spent waiting for a pooled connection',
+                       buckets=(.0005, .001, .005, .01, .05, .1, .5, 1, 5, 30))
+POOL_CHECKED_OUT = LazyMetric('Gauge', 'puppy_db_pool_checked_out', 'Connections currently checked out',
+                              multiprocess_mode='livesum')
+POOL_OVERFLOW = LazyMetric('Gauge', 'puppy_db_pool_overflow', 'Connections opened beyond the pool size',
+                           multiprocess_mode='livesum')
+TEMPLATE_RENDER = LazyMetric('Histogram', 'puppy_template_render_seconds', 'Template render time',
+                             ['template'])
+LAST_SEEN_TOUCHES = LazyMetric('Counter', 'puppy_last_seen_touches_total',
+                               'Authenticated requests that touched last_seen')
+LAST_SEEN_SKIPPED = LazyMetric('Counter', 'puppy_last_seen_skipped_total',
+                               'last_seen touches dropped as younger than LAST_SEEN_RESOLUTION')
+LAST_SEEN_FLUSHES = LazyMetric('Counter', 'puppy_last_seen_flushes_total', 'Batched last_seen writes')
+LAST_SEEN_ROWS = LazyMetric('Counter', 'puppy_last_seen_rows_written_total',
+                            'Rows updated by batched last_seen writes')
+RATELIMIT_REJECTIONS = LazyMetric('Counter', 'puppy_ratelimit_rejections_total', 'Requests rejected with a 429',
+                                  ['limit', 'key'])
+
+
+def multiprocess_enabled():
+    return 'prometheus_multiproc_dir' in os.environ
+
+
+class Metrics(object):
+    """Prometheus metrics served at ``/metrics``.
+
+    Records per-endpoint request latency and status counts, connection pool
+    checkouts, overflow and checkout wait time, and template render time.
+    Under gunicorn (see ``gunicorn_config.py``) every worker writes its
+    samples to ``prometheus_multiproc_dir`` and ``/metrics`` aggregates them,
+    so the numbers cover all workers whichever one answers the scrape.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from . import db
+        if not app.config['METRICS_ENABLED']:
+            return
+        LazyMetric.recording = True
+        # Time from the very first hook so pages served from the page cache
+        # are counted too.
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.after_request(self._record)
+        app.teardown_request(self._record_error)
+        app.add_url_rule(app.config['METRICS_URL'], 'metrics', self.view)
+        app.jinja_env.template_class = TimedTemplate
+        # The engine is created lazily; instrument it once it exists.
+        app.before_first_request(lambda: self._instrument_engine(db.get_engine(app)))
+
+    def view(self):
+        from prometheus_client import CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, \
+            multiprocess
+        if multiprocess_enabled():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    def _instrument_engine(self, engine):
+        self._instrument_pool(engine.pool)
+        event.listen(engine, 'engine_disposed', lambda engine: self._instrument_pool(engine.pool))
+        event.listen(engine, 'checkout', self._checkout)
+        event.listen(engine, 'checkin', self._checkin)
+
+    def _instrument_pool(self, pool):
+        do_get = pool._do_get
+
+        def timed_do_get():
+            start = time.perf_counter()
+            try:
+                return do_get()
+            finally:
+                POOL_WAIT.observe(time.perf_counter() - start)
+        pool._do_get = timed_do_get
+        self.pool = pool
+
+    def _pool_gauges(self):
+        if hasattr(self.pool, 'checkedout'):
+            POOL_CHECKED_OUT.set(self.pool.checkedout())
+            POOL_OVERFLOW.set(max(self.pool.overflow(), 0))
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        POOL_CHECKOUTS.inc()
+        self._pool_gauges()
+
+    def _checkin(self, dbapi_connection, connection_record):
+        self._pool_gauges()
+
+    def _start(self):
+        g.metrics_start = time.perf_counter()
+
+    def _observe(self, status):
+        start = g.get('metrics_start')
+        if start is None:
+            return
+        g.metrics_start = None
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - start)
+        REQUEST_COUNT.labels(endpoint, request.method, str(status)).inc()
+
+    def _record(self, response):
+        self._observe(response.status_code)
+        return response
+
+    def _record_error(self, exc):
+        # after_request hooks are skipped when a view raises an unhandled
+        # exception; count those requests here as 500s.
+        if exc is not None:
+            self._observe(500)
+
+
+class TimedTemplate(Template):
+    """Template timing each top-level ``render`` call."""
+
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            TEMPLATE_RENDER.labels(self.name or '<string>').observe(time.perf_counter() - start)
@@ -1,10 +1,15 @@
+from collections import Counter
 from datetime import datetime
 import hashlib
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask import current_app, request
+from flask import current_app, request, g
 from flask.ext.login import UserMixin, AnonymousUserMixin
-from . import db, login_manager
+from . import db, login_manager, last_seen_tracker, identity_cache, group_cache, password_hasher, \
+    token_authority
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import event, literal
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.schema import UniqueConstraint
 
 
@@ -21,38 +26,45 @@ def initialize_database():
         'Administrator': ('System administrator group', True),
     }
 
+    existing_users = dict((user.email, user) for user in User.query.filter(User.email.in_(users)))
     for u in users:
-        user = User.query.filter_by(email=u).first()
+        user = existing_users.get(u)
         if user is None:
-            user = User(email=u)
+            user = existing_users[u] = User(email=u)
         user.first_name = users[u][0]
         user.last_name = users[u][1]
         user.password_hash = users[u][2]
         db.session.add(user)
 
+    existing_groups = dict((group.name, group) for group in Group.query.filter(Group.name.in_(groups)))
     for g in groups:
-        group = Group.query.filter_by(name=g).first()
+        group = existing_groups.get(g)
         if group is None:
-            group = Group(name=g)
+            group = existing_groups[g] = Group(name=g)
         group.description = groups[g][0]
         group.default = groups[g][1]
         db.session.add(group)
 
-    admin_user = User.query.filter_by(email='admin@puppy').first()
-    pat_user = User.query.filter_by(email='pat@puppy').first()
+    admin_user = existing_users['admin@puppy']
+    pat_user = existing_users['pat@puppy']
 
-    admin_group = Group.query.filter_by(name='Administrator').first()
-    user_group = Group.query.filter_by(name='User').first()
+    admin_group = existing_groups['Administrator']
+    user_group = existing_groups['User']
 
-    admin_group.users.append(admin_user)
-    db.session.add(admin_group)
-
-    user_group.users.append(pat_user)
-    db.session.add(user_group)
+    # Append from the dynamic side so a large group's members are not loaded.
+    for user, group in ((admin_user, admin_group), (pat_user, user_group)):
+        if user.id is None or group.id is None or user.groups.filter(Group.id == group.id).first() is None:
+            user.groups.append(group)
 
     db.session.commit()
 
 
+def pending_index(name, columns, approved, rejected_on):
+    """A partial index over the rows still awaiting moderation, for the moderation queue."""
+    pending = db.and_(approved, rejected_on.is_(None))
+    return db.Index(name, *columns, postgresql_where=pending, sqlite_where=pending)
+
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
     id = db.Column(db.Integer, primary_key=True)
@@ -69,6 +81,10 @@ class Notification(db.Model):
                                    foreign_keys=sent_to,
                                    backref=db.backref('sent_to_user', lazy='dynamic'))
 
+    __table_args__ = (
+        db.Index('ix_notifications_sent_to_created_on', 'sent_to', 'created_on', 'id'),
+    )
+
     def __str__(self):
         return self.message
 
@@ -88,18 +104,92 @@ class Notification(db.Model):
         return json_notifications
 
     @staticmethod
-    def bulk_notify(title, message, current_user_id):
-        users = User.query.all()
-        for user in users:
-            notification = Notification()
-            notification.title = title
-            notification.message = message
-            notification.created_by = current_user_id
-            notification.sent_to = user.id
-            db.session.add(notification)
+    def bulk_notify(title, message, current_user_id, groups=None, approved_only=False):
+        """Notify every user in the audience with one INSERT ... SELECT; returns the rows written."""
+        audience = []
+        if groups:
+            audience.append(User.id.in_(db.session.query(group_memberships.c.user_id)
+                                        .join(Group, Group.id == group_memberships.c.group_id)
+                                        .filter(Group.name.in_(groups))))
+        if approved_only:
+            audience.append(User.approved == True)
+        recipients = db.session.query(
+            User.id,
+            literal(title, db.Text),
+            literal(message, db.Text),
+            literal(current_user_id, db.Integer),
+            literal(datetime.utcnow(), db.DateTime),
+        ).filter(*audience)
+        table = Notification.__table__
+        result = db.session.execute(table.insert().from_select(
+            [table.c.sent_to, table.c.title, table.c.message, table.c.created_by, table.c.created_on],
+            recipients.statement))
+        User.query.filter(*audience).update({User.unread_count: User.unread_count + 1},
+                                            synchronize_session=False)
+        db.session.commit()
+        identity_cache.clear()
+        return result.rowcount
+
+    @staticmethod
+    def deliver(notifications):
+        """Insert notification rows (dicts of column values) and bump the recipients' unread counts."""
+        if not notifications:
+            return
+        db.session.execute(Notification.__table__.insert(), notifications)
+        received = Counter(notification['sent_to'] for notification in notifications)
+        users = User.__table__
+        db.session.execute(
+            users.update().where(users.c.id == db.bindparam('_id'))
+                          .values(unread_count=users.c.unread_count + db.bindparam('_received')),
+            [{'_id': user_id, '_received': count} for user_id, count in received.items()])
+        for user_id in received:
+            identity_cache.invalidate(user_id)
+
+    @staticmethod
+    def _selection(user_id, ids=None, before=None):
+        criteria = [Notification.sent_to == user_id]
+        if ids is not None:
+            criteria.append(Notification.id.in_(ids))
+        if before is not None:
+            criteria.append(Notification.created_on < before)
+        return criteria
+
+    @staticmethod
+    def bulk_mark_read(user_id, ids=None, before=None):
+        """Mark a user's unread notifications read with one UPDATE; returns the rows changed."""
+        if ids is not None and not ids:
+            return 0
+        criteria = Notification._selection(user_id, ids, before) + [Notification.read_on.is_(None)]
+        marked = Notification.query.filter(*criteria).update({Notification.read_on: datetime.utcnow()},
+                                                             synchronize_session=False)
+        if marked:
+            User.query.filter_by(id=user_id) \
+                      .update({User.unread_count: User.unread_count - marked}, synchronize_session=False)
+            identity_cache.invalidate(user_id)
+        db.session.commit()
+        return marked
+
+    @staticmethod
+    def bulk_delete(user_id, ids=None, before=None):
+        """Delete a user's notifications, selected as for ``bulk_mark_read``; returns the rows deleted."""
+        if ids is not None and not ids:
+            return 0
+        criteria = Notification._selection(user_id, ids, before)
+        unread = Notification.query.filter(Notification.read_on.is_(None), *criteria) \
+                                   .delete(synchronize_session=False)
+        read = Notification.query.filter(*criteria).delete(synchronize_session=False)
+        if unread:
+            User.query.filter_by(id=user_id) \
+                      .update({User.unread_count: User.unread_count - unread}, synchronize_session=False)
+            identity_cache.invalidate(user_id)
         db.session.commit()
+        return unread + read
 
     def mark_read(self):
+        if self.read_on is None:
+            User.query.filter_by(id=self.sent_to) \
+                      .update({User.unread_count: User.unread_count - 1}, synchronize_session=False)
+            identity_cache.invalidate(self.sent_to)
         self.read_on = datetime.utcnow()
         return self
 
@@ -122,7 +212,19 @@ class VentureResource(db.Model):
 
     @property
     def name(self):
-        return '{} provided by {}'.format(self.resource.name, self.company.name)
+        name = self.resource.name if self.resource is not None else 'Removed resource'
+        if self.company is None:
+            return name
+        return '{} provided by {}'.format(name, self.company.name)
+
+    def to_json(self):
+        json_venture_resource = {
+            'id': self.id,
+            'name': self.name,
+            'resource': {'id': self.resource.id, 'name': self.resource.name} if self.resource is not None else None,
+            'company': {'id': self.company.id, 'name': self.company.name} if self.company is not None else None,
+        }
+        return json_venture_resource
 
     def __str__(self):
         return self.name
@@ -142,7 +244,18 @@ class VentureSkill(db.Model):
 
     @property
     def name(self):
-        return '{} provided by {}'.format(self.skill.name, self.user.display_name)
+        name = self.skill.name if self.skill is not None else 'Removed skill'
+        if self.user is None:
+            return name
+        return '{} provided by {}'.format(name, self.user.display_name)
+
+    def to_json(self):
+        json_venture_skill = {
+            'id': self.id,
+            'skill': {'id': self.skill.id, 'name': self.skill.name} if self.skill is not None else None,
+            'user': self.user.to_json() if self.user is not None else None,
+        }
+        return json_venture_skill
 
     def __str__(self):
         return self.name
@@ -163,12 +276,50 @@ class Venture(db.Model):
     approved_on = db.Column(db.DateTime())
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     approved_by_user = db.relationship("User", foreign_keys=approved_by)
+    rejected_on = db.Column(db.DateTime())
+    rejected_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     student_venture = db.Column(db.Boolean, default=True)
     alumni_venture = db.Column(db.Boolean, default=False)
     external_venture = db.Column(db.Boolean, default=False)
     resources = db.relationship('VentureResource', backref='venture', lazy='dynamic')
     skills = db.relationship('VentureSkill', backref='venture', lazy='dynamic')
 
+    __table_args__ = (
+        pending_index('ix_ventures_pending', ['created_on', 'id'], approved_on.is_(None), rejected_on),
+    )
+
+    def to_json(self, resources=(), skills=()):
+        json_venture = {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'public_info': self.public_info,
+            'created_on': str(self.created_on),
+            'created_by': self.created_by_user.to_json() if self.created_by_user is not None else None,
+            'approved': self.approved_on is not None,
+            'student_venture': self.student_venture,
+            'alumni_venture': self.alumni_venture,
+            'external_venture': self.external_venture,
+            'resources': [resource.to_json() for resource in resources],
+            'skills': [skill.to_json() for skill in skills],
+        }
+        return json_venture
+
+    @staticmethod
+    def details_to_json(ventures):
+        """Serialize ``ventures`` with their resources and skills in one query per relationship."""
+        venture_ids = [venture.id for venture in ventures]
+        resources, skills = {}, {}
+        if venture_ids:
+            for resource in VentureResource.query.options(db.joinedload('company'), db.joinedload('resource')) \
+                    .filter(VentureResource.venture_id.in_(venture_ids)).order_by(VentureResource.id):
+                resources.setdefault(resource.venture_id, []).append(resource)
+            for skill in VentureSkill.query.options(db.joinedload('skill'), db.joinedload('user')) \
+                    .filter(VentureSkill.venture_id.in_(venture_ids)).order_by(VentureSkill.id):
+                skills.setdefault(skill.venture_id, []).append(skill)
+        return [venture.to_json(resources.get(venture.id, ()), skills.get(venture.id, ()))
+                for venture in ventures]
+
     def __str__(self):
         return self.name
 
@@ -187,8 +338,14 @@ class Company(db.Model):
     approved_on = db.Column(db.DateTime())
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     approved_by_user = db.relationship("User", foreign_keys=approved_by)
+    rejected_on = db.Column(db.DateTime())
+    rejected_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     resources = db.relationship('Resource', secondary=company_resources, backref=db.backref('company', lazy='dynamic'))
 
+    __table_args__ = (
+        pending_index('ix_company_pending', ['created_on', 'id'], approved_on.is_(None), rejected_on),
+    )
+
     def __str__(self):
         return self.name
 
@@ -207,6 +364,12 @@ class Resource(db.Model):
     approved_on = db.Column(db.DateTime())
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     approved_by_user = db.relationship("User", foreign_keys=approved_by)
+    rejected_on = db.Column(db.DateTime())
+    rejected_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+
+    __table_args__ = (
+        pending_index('ix_resource_pending', ['created_on', 'id'], approved_on.is_(None), rejected_on),
+    )
 
     def __str__(self):
         return self.name
@@ -234,16 +397,76 @@ class Category(db.Model):
     description = db.Column(db.String(64))
     parent_id = db.Column(db.Integer, db.ForeignKey('categories.id'), index=True)
     parent = db.relationship('Category', remote_side=id, backref='children')
+    # Materialized path of ids ('/1/4/9/') and the matching ' > ' joined names,
+    # kept up to date by the mapper events below.
+    path = db.Column(db.String(255))
+    lineage = db.Column(db.Text())
     # skills = db.relationship('Skill', backref='category', lazy='dynamic')
 
+    __table_args__ = (
+        db.Index('ix_categories_path', 'path', postgresql_ops={'path': 'varchar_pattern_ops'}),
+    )
+
+    lineage_separator = ' > '
+
+    def subtree(self):
+        """Query this category and everything below it in one statement."""
+        if self.path is None:
+            return Category.descendants_cte(self.id)
+        return Category.query.filter(Category.path.startswith(self.path))
+
+    def subtree_skills(self):
+        """Query the skills filed under this category or any of its descendants."""
+        category_ids = db.session.query(self.subtree().with_entities(Category.id).subquery())
+        return Skill.query.join(skills_category) \
+                          .filter(skills_category.c.category_id.in_(category_ids)) \
+                          .distinct()
+
+    @classmethod
+    def descendants_cte(cls, category_id):
+        """Query a category and its descendants with a recursive CTE, for rows without a path yet."""
+        tree = db.session.query(cls.id).filter(cls.id == category_id).cte('category_tree', recursive=True)
+        parent = db.aliased(tree, name='parent')
+        child = db.aliased(cls, name='child')
+        tree = tree.union_all(db.session.query(child.id).filter(child.parent_id == parent.c.id))
+        return cls.query.filter(cls.id.in_(db.session.query(tree.c.id)))
+
+    @classmethod
+    def rebuild_paths(cls):
+        """Recompute path and lineage for every category; returns the number of rows."""
+        rows = dict((row.id, row) for row in db.session.query(cls.id, cls.parent_id, cls.name))
+        resolved = {}
+
+        def resolve(category_id):
+            if category_id not in resolved:
+                row = rows[category_id]
+                if row.parent_id is None or row.parent_id not in rows:
+                    resolved[category_id] = ('/{}/'.format(row.id), row.name)
+                else:
+                    parent_path, parent_lineage = resolve(row.parent_id)
+                    resolved[category_id] = ('{}{}/'.format(parent_path, row.id),
+                                             parent_lineage + cls.lineage_separator + row.name)
+            return resolved[category_id]
+
+        table = cls.__table__
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('_id'))
+                          .values(path=db.bindparam('_path'), lineage=db.bindparam('_lineage')),
+            [{'_id': category_id, '_path': path, '_lineage': lineage}
+             for category_id, (path, lineage) in ((i, resolve(i)) for i in rows)])
+        db.session.commit()
+        return len(rows)
+
     def __str__(self):
+        if self.lineage is not None:
+            return self.lineage
         lineage = [self.name]
         next_parent = self.parent
         while next_parent:
             lineage.append(next_parent.name)
             next_parent = next_parent.parent
         lineage.reverse()
-        return ' > '.join(lineage)
+        return self.lineage_separator.join(lineage)
 
     def __repr__(self):
         return self.__str__()
@@ -259,7 +482,9 @@ user_skills = db.Table('user_skill',
                        db.Column('id', db.Integer, primary_key=True),
                        db.Column('user_id', db.Integer, db.ForeignKey('users.id')),
                        db.Column('skill_id', db.Integer, db.ForeignKey('skills.id')),
-                       UniqueConstraint('user_id', 'skill_id')
+                       UniqueConstraint('user_id', 'skill_id'),
+                       # Members with a given skill, for the directory filter.
+                       db.Index('ix_user_skill_skill_id_user_id', 'skill_id', 'user_id'),
                        )
 
 
@@ -270,15 +495,26 @@ class Skill(db.Model):
     description = db.Column(db.String(64))
     categories = db.relationship('Category', secondary=skills_category, backref=db.backref('skills', lazy='dynamic'))
     # users = db.relationship('User', secondary=user_skills, backref=db.backref('skills', lazy='dynamic'))
+    # Denormalized sizes of users and categories, kept in step by the session
+    # events at the bottom of this module (see refresh_counts).
+    user_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    category_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    @classmethod
+    def counts(cls, skill_ids):
+        """Return ``{skill_id: (user_count, category_count)}`` in one query."""
+        if not skill_ids:
+            return {}
+        return dict((skill_id, (user_count, category_count)) for skill_id, user_count, category_count in
+                    db.session.query(cls.id, cls.user_count, cls.category_count).filter(cls.id.in_(skill_ids)))
 
     def to_json(self):
         json_skill = {
             'name': self.name,
             'description': self.description,
-            'categories': self.categories,
-            'category_count': len(self.categories),
-            'users': self.users,
-            'user_count': len(self.users),
+            'categories': [str(category) for category in self.categories],
+            'category_count': self.category_count,
+            'user_count': self.user_count,
         }
         return json_skill
 
@@ -305,29 +541,52 @@ class Group(db.Model):
     description = db.Column(db.String(64))
     default = db.Column(db.Boolean, default=False, index=True)
     users = db.relationship('User', secondary=group_memberships, backref=db.backref('groups', lazy='dynamic'))
+    user_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
 
     administrative_groups = ['Administrator']
 
+    @classmethod
+    def member_ids(cls, group_list):
+        """Return the distinct ids of users in any of ``group_list``, cached for ``GROUP_CACHE_TTL``."""
+        key = ('member_ids', tuple(sorted(group_list)))
+        user_ids = group_cache.get(key)
+        if user_ids is None:
+            user_ids = [user_id for (user_id,) in
+                        db.session.query(group_memberships.c.user_id)
+                        .join(cls, cls.id == group_memberships.c.group_id)
+                        .filter(cls.name.in_(group_list))
+                        .distinct()]
+            group_cache.set(key, user_ids)
+        return user_ids
+
+    @classmethod
+    def get_admin_user_ids(cls):
+        return cls.member_ids(cls.administrative_groups)
+
     @classmethod
     def get_admin_users(cls):
-        admin_user_list = []
-        for admin_group in cls.groups_from_list(cls.administrative_groups):
-            for user in admin_group.users:
-                if user not in admin_user_list:
-                    admin_user_list.append(user)
-        return admin_user_list
+        admin_user_ids = cls.get_admin_user_ids()
+        if not admin_user_ids:
+            return []
+        return User.query.filter(User.id.in_(admin_user_ids)).all()
 
     @classmethod
     def groups_from_list(cls, group_list):
         return cls.query.filter(cls.name.in_(group_list))
 
+    @classmethod
+    def counts(cls, group_ids):
+        """Return ``{group_id: user_count}`` in one query."""
+        if not group_ids:
+            return {}
+        return dict(db.session.query(cls.id, cls.user_count).filter(cls.id.in_(group_ids)))
+
     def to_json(self):
         json_group = {
             'name': self.name,
             'description': self.description,
             'default': self.default,
-            'users': self.users,
-            'user_count': len(self.users),
+            'user_count': self.user_count,
         }
         return json_group
 
@@ -352,11 +611,27 @@ class User(UserMixin, db.Model):
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     # Having a problem with self referencing keys and automatically mapping objects
     # approved_by_user = db.relationship('User', foreign_keys=approved_by)
+    rejected_on = db.Column(db.DateTime())
+    rejected_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     last_seen = db.Column(db.DateTime(), default=datetime.utcnow)
     avatar_hash = db.Column(db.String(32))
+    # Denormalized count of notifications with read_on IS NULL, for the inbox badge.
+    unread_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # Bumped to revoke every API token issued to the user.
+    token_generation = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     # approved_by_me = db.relationship('User.approved_by', backref='approved_by_me', lazy='dynamic')
     skills = db.relationship('Skill', secondary=user_skills, backref=db.backref('users', lazy='dynamic'))
 
+    # Keyset orderings of the member directory, alone and behind its
+    # equality filters.
+    __table_args__ = (
+        db.Index('ix_users_registered_on_id', 'registered_on', 'id'),
+        db.Index('ix_users_last_seen_id', 'last_seen', 'id'),
+        db.Index('ix_users_approved_registered_on_id', 'approved', 'registered_on', 'id'),
+        db.Index('ix_users_location_registered_on_id', 'location', 'registered_on', 'id'),
+        pending_index('ix_users_pending', ['registered_on', 'id'], approved == False, rejected_on),
+    )
+
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
         if self.email is not None and self.avatar_hash is None:
@@ -370,10 +645,17 @@ class User(UserMixin, db.Model):
 
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
+        identity_cache.invalidate(self.id)
 
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Check the password, upgrading a legacy hash in the session when it matches."""
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            self.password = password
+            db.session.add(self)
+        return True
 
     def generate_confirmation_token(self, expiration=3600):
         s = Serializer(current_app.config['SECRET_KEY'], expiration)
@@ -389,6 +671,7 @@ class User(UserMixin, db.Model):
             return False
         self.confirmed = True
         db.session.add(self)
+        identity_cache.invalidate(self.id)
         return True
 
     def generate_reset_token(self, expiration=3600):
@@ -428,24 +711,31 @@ class User(UserMixin, db.Model):
         self.avatar_hash = hashlib.md5(
             self.email.encode('utf-8')).hexdigest()
         db.session.add(self)
+        identity_cache.invalidate(self.id)
         return True
 
+    @property
+    def group_names(self):
+        if getattr(self, '_group_names', None) is None:
+            self._group_names = frozenset(group.name for group in self.groups)
+        return self._group_names
+
     @property
     def is_administrator(self):
-        return bool(self.in_groups(Group.administrative_groups))
+        return not self.group_names.isdisjoint(Group.administrative_groups)
 
     def in_groups(self, group_list, require_all=False):
+        """Return the names in ``group_list`` this user belongs to, or False if ``require_all`` fails."""
         group_match = []
-        for group in Group.groups_from_list(group_list):
-            if group in self.groups:
-                group_match.append(group)
+        for name in group_list:
+            if name in self.group_names:
+                group_match.append(name)
             elif require_all:
                 return False
         return group_match
 
     def ping(self):
-        self.last_seen = datetime.utcnow()
-        db.session.add(self)
+        last_seen_tracker.touch(self.id, self.last_seen)
 
     def gravatar(self, size=100, default='identicon', rating='g'):
         if request.is_secure:
@@ -465,30 +755,59 @@ class User(UserMixin, db.Model):
         }
         return json_user
 
+    def to_directory_json(self):
+        """``to_json`` plus the fields the member directory shows to members."""
+        json_user = self.to_json()
+        json_user.update({
+            'id': self.id,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'location': self.location,
+        })
+        return json_user
+
     def generate_auth_token(self, expiration):
-        s = Serializer(current_app.config['SECRET_KEY'],
-                       expires_in=expiration)
-        return s.dumps({'id': self.id}).decode('ascii')
+        return token_authority.generate(self, expiration)
 
     @staticmethod
     def verify_auth_token(token):
-        s = Serializer(current_app.config['SECRET_KEY'])
-        try:
-            data = s.loads(token)
-        except:
-            return None
-        return User.query.get(data['id'])
+        return token_authority.verify(token)
+
+    def revoke_auth_tokens(self):
+        self.token_generation = (self.token_generation or 0) + 1
+        db.session.add(self)
+        identity_cache.invalidate(self.id)
+
+    @staticmethod
+    def refresh_unread_counts(drifted_only=False):
+        """Recompute ``unread_count`` with one correlated UPDATE; returns the users updated."""
+        notifications = Notification.__table__
+        users = User.__table__
+        unread = db.select([db.func.count(notifications.c.id)]).where(db.and_(
+            notifications.c.sent_to == users.c.id, notifications.c.read_on.is_(None))).as_scalar()
+        statement = users.update().values(unread_count=unread)
+        if drifted_only:
+            statement = statement.where(users.c.unread_count != unread)
+        updated = db.session.execute(statement).rowcount
+        identity_cache.clear()
+        return updated
+
+    def fetch_unread_count(self):
+        """Read ``unread_count`` from the database rather than a cached identity."""
+        return db.session.query(User.unread_count).filter(User.id == self.id).scalar()
 
     def send_message(self, recipient_list, title, message):
-        if isinstance(recipient_list, int):
+        """Notify each recipient, given as users or user ids, in one bulk insert."""
+        if isinstance(recipient_list, (int, User)):
             recipient_list = [recipient_list]
-        for recipient in recipient_list:
-            notification = Notification()
-            notification.title = title
-            notification.message = message
-            notification.created_by = self.id
-            notification.sent_to = recipient.id
-            db.session.add(notification)
+        now = datetime.utcnow()
+        notifications = [{'title': title,
+                          'message': message,
+                          'created_by': self.id,
+                          'sent_to': getattr(recipient, 'id', recipient),
+                          'created_on': now}
+                         for recipient in recipient_list]
+        Notification.deliver(notifications)
         db.session.commit()
 
     @property
@@ -509,7 +828,11 @@ class User(UserMixin, db.Model):
 
 
 class AnonymousUser(AnonymousUserMixin):
-    pass
+    group_names = frozenset()
+    is_administrator = False
+
+    def in_groups(self, group_list, require_all=False):
+        return False if require_all and group_list else []
 
 
 login_manager.anonymous_user = AnonymousUser
@@ -517,4 +840,181 @@ login_manager.anonymous_user = AnonymousUser
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    cached = identity_cache.get(user_id)
+    if cached is None:
+        user = User.query.get(user_id)
+        if user is not None:
+            columns = dict((attr.key, getattr(user, attr.key)) for attr in User.__mapper__.column_attrs)
+            identity_cache.set(user_id, (columns, user.group_names))
+        return user
+    # Rebuild a clean, detached instance from the snapshot and attach it to
+    # the session without going back to the database.
+    columns, group_names = cached
+    user = User.__mapper__.class_manager.new_instance()
+    for key, value in columns.items():
+        setattr(user, key, value)
+    make_transient_to_detached(user)
+    user = db.session.merge(user, load=False)
+    user._group_names = group_names
+    return user
+
+
+@login_manager.request_loader
+def load_user_from_request(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    user = token_authority.verify(token.strip())
+    if user is not None:
+        g.token_used = True
+    return user
+
+
+# Also fired through the User.groups backref.
+@event.listens_for(Group.users, 'append')
+@event.listens_for(Group.users, 'remove')
+def _group_membership_changed(group, user, initiator):
+    identity_cache.invalidate(user.id)
+    group_cache.clear()
+
+
+@event.listens_for(Group, 'after_update')
+@event.listens_for(Group, 'after_delete')
+def _group_changed(mapper, connection, group):
+    group_cache.clear()
+
+
+def _category_position(connection, category):
+    """Return the (path, lineage) the category should have given its parent row."""
+    table = Category.__table__
+    parent = None
+    if category.parent_id is not None:
+        parent = connection.execute(db.select([table.c.path, table.c.lineage])
+                                    .where(table.c.id == category.parent_id)).first()
+    if parent is None or parent.path is None:
+        return '/{}/'.format(category.id), category.name
+    return ('{}{}/'.format(parent.path, category.id),
+            parent.lineage + Category.lineage_separator + category.name)
+
+
+@event.listens_for(Category, 'after_insert')
+def _category_inserted(mapper, connection, category):
+    path, lineage = _category_position(connection, category)
+    table = Category.__table__
+    connection.execute(table.update().where(table.c.id == category.id)
+                                     .values(path=path, lineage=lineage))
+    set_committed_value(category, 'path', path)
+    set_committed_value(category, 'lineage', lineage)
+
+
+@event.listens_for(Category, 'after_update')
+def _category_updated(mapper, connection, category):
+    state = db.inspect(category)
+    if not (state.attrs.parent_id.history.has_changes() or state.attrs.name.history.has_changes()):
+        return
+    old_path, old_lineage = category.path, category.lineage
+    path, lineage = _category_position(connection, category)
+    if old_path is None or old_lineage is None:
+        return _category_inserted(mapper, connection, category)
+    if path.startswith(old_path) and path != old_path:
+        raise ValueError('Cannot move category {!r} below its own descendant'.format(category.name))
+    # Rewrite the prefix of the category and all of its descendants at once.
+    table = Category.__table__
+    connection.execute(table.update().where(table.c.path.startswith(old_path)).values(
+        path=db.literal(path) + db.func.substr(table.c.path, len(old_path) + 1),
+        lineage=db.literal(lineage) + db.func.substr(table.c.lineage, len(old_lineage) + 1)))
+    session = db.object_session(category)
+    for obj in list(session.identity_map.values()) if session is not None else [category]:
+        if isinstance(obj, Category) and obj.path and obj.path.startswith(old_path):
+            set_committed_value(obj, 'path', path + obj.path[len(old_path):])
+            set_committed_value(obj, 'lineage', lineage + obj.lineage[len(old_lineage):])
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, user):
+    identity_cache.invalidate(user.id)
+
+
+def refresh_counts(connection, skill_ids=None, group_ids=None, drifted_only=False):
+    """Recompute skill and group counts with one UPDATE per table; returns the rows updated."""
+    skills, groups = Skill.__table__, Group.__table__
+    user_count = db.select([db.func.count()]).where(user_skills.c.skill_id == skills.c.id).as_scalar()
+    category_count = db.select([db.func.count()]).where(skills_category.c.skill_id == skills.c.id).as_scalar()
+    member_count = db.select([db.func.count()]).where(group_memberships.c.group_id == groups.c.id).as_scalar()
+    updated = []
+    for table, ids, values in ((skills, skill_ids, {'user_count': user_count, 'category_count': category_count}),
+                               (groups, group_ids, {'user_count': member_count})):
+        if ids is not None and not ids:
+            updated.append(0)
+            continue
+        statement = table.update().values(**values)
+        if ids is not None:
+            statement = statement.where(table.c.id.in_(ids))
+        if drifted_only:
+            statement = statement.where(db.or_(*[table.c[name] != value for name, value in values.items()]))
+        updated.append(connection.execute(statement).rowcount)
+    return tuple(updated)
+
+
+@event.listens_for(SignallingSession, 'before_flush')
+def _collect_removed_memberships(session, flush_context, instances):
+    # Deleting a user or category drops its association rows without the
+    # other side's collection history recording it; note who is affected
+    # while the rows still exist.
+    user_ids = [obj.id for obj in session.deleted if isinstance(obj, User)]
+    category_ids = [obj.id for obj in session.deleted if isinstance(obj, Category)]
+    if not (user_ids or category_ids):
+        return
+    skill_ids, group_ids = session.info.setdefault('count_changes', (set(), set()))
+    if user_ids:
+        skill_ids.update(skill_id for (skill_id,) in session.execute(
+            db.select([user_skills.c.skill_id]).where(user_skills.c.user_id.in_(user_ids))))
+        group_ids.update(group_id for (group_id,) in session.execute(
+            db.select([group_memberships.c.group_id]).where(group_memberships.c.user_id.in_(user_ids))))
+    if category_ids:
+        skill_ids.update(skill_id for (skill_id,) in session.execute(
+            db.select([skills_category.c.skill_id]).where(skills_category.c.category_id.in_(category_ids))))
+
+
+def _changed_ids(obj, name):
+    history = db.inspect(obj).attrs[name].history
+    # Collections that were never loaded report a blank history of Nones.
+    return [related.id for related in list(history.added or ()) + list(history.deleted or ())]
+
+
+def _changed(obj, name):
+    return db.inspect(obj).attrs[name].history.has_changes()
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def _update_counts(session, flush_context):
+    skill_ids, group_ids = session.info.pop('count_changes', (set(), set()))
+    for obj in session.new.union(session.dirty):
+        if isinstance(obj, User):
+            skill_ids.update(_changed_ids(obj, 'skills'))
+            group_ids.update(_changed_ids(obj, 'groups'))
+        elif isinstance(obj, Category):
+            skill_ids.update(_changed_ids(obj, 'skills'))
+        elif isinstance(obj, Skill):
+            if _changed(obj, 'users') or _changed(obj, 'categories'):
+                skill_ids.add(obj.id)
+        elif isinstance(obj, Group):
+            if _changed(obj, 'users'):
+                group_ids.add(obj.id)
+    skill_ids.difference_update(obj.id for obj in session.deleted if isinstance(obj, Skill))
+    group_ids.difference_update(obj.id for obj in session.deleted if isinstance(obj, Group))
+    if skill_ids or group_ids:
+        refresh_counts(session.connection(), skill_ids, group_ids)
+        session.info['refreshed_counts'] = (skill_ids, group_ids)
+
+
+@event.listens_for(SignallingSession, 'after_flush_postexec')
+def _expire_counts(session, flush_context):
+    skill_ids, group_ids = session.info.pop('refreshed_counts', ((), ()))
+    for model, ids, names in ((Skill, skill_ids, ['user_count', 'category_count']),
+                              (Group, group_ids, ['user_count'])):
+        for object_id in ids:
+            obj = session.identity_map.get(db.inspect(model).identity_key_from_primary_key((object_id,)))
+            if obj is not None:
+                session.expire(obj, names)
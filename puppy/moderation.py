@@ -0,0 +1,146 @@
+"""One moderation queue over members, ventures, companies and resources.
+
+An item is pending while it has neither been approved nor rejected; each
+model has a partial index over its pending rows (see ``models.pending_index``)
+ordered by submission time, so the queue only ever reads pending rows.
+
+The queue is ordered oldest first by ``(submitted_on, kind, id)`` and read with
+keyset pagination: every model contributes at most one page of its own
+pending rows, seeking past the cursor through its partial index, and a single
+``UNION ALL`` statement merges them.
+
+Approving or rejecting is one ``UPDATE`` per model, stamped with the
+moderator and the time.  The rows carrying that stamp are then read back in
+one statement, so items another moderator handled first are not notified
+twice, and their submitters are notified with one batched insert.  Those
+rows are reindexed too, since search only holds published items and bulk
+updates bypass its session events.
+"""
+from collections import namedtuple, OrderedDict
+from datetime import datetime
+
+from . import db, identity_cache
+from .exceptions import ValidationError
+from .models import User, Venture, Company, Resource, Notification
+from .pagination import KeysetPage, after, decode_cursor, encode_cursor
+from .search import INDEXED, reindex
+
+# kind -> (model, submission time column, submitter column, title column)
+Moderated = namedtuple('Moderated', ['model', 'submitted_on', 'submitted_by', 'title'])
+
+MODERATED = OrderedDict([
+    ('user', Moderated(User, User.registered_on, User.id, User.username)),
+    ('venture', Moderated(Venture, Venture.created_on, Venture.created_by, Venture.name)),
+    ('company', Moderated(Company, Company.created_on, Company.created_by, Company.name)),
+    ('resource', Moderated(Resource, Resource.created_on, Resource.created_by, Resource.name)),
+])
+
+QueueItem = namedtuple('QueueItem', ['kind', 'id', 'title', 'submitted_on', 'submitted_by'])
+
+
+def pending(model):
+    """The criteria of rows awaiting moderation; must match the model's partial index."""
+    approved = model.approved == False if model is User else model.approved_on.is_(None)
+    return [approved, model.rejected_on.is_(None)]
+
+
+def check_kinds(kinds):
+    unknown = set(kinds) - set(MODERATED)
+    if unknown:
+        raise ValidationError('Unknown moderation kind: {}'.format(', '.join(sorted(unknown))))
+
+
+def _columns(kind):
+    moderated = MODERATED[kind]
+    return [db.literal(kind, db.String).label('kind'),
+            moderated.model.id.label('id'),
+            db.cast(moderated.title, db.Text).label('title'),
+            moderated.submitted_on.label('submitted_on'),
+            moderated.submitted_by.label('submitted_by')]
+
+
+def queue(kinds=None, cursor=None, limit=20):
+    """Return a ``KeysetPage`` of ``QueueItem``s, oldest first, in one statement."""
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    kinds = list(kinds or MODERATED)
+    check_kinds(kinds)
+    branches = []
+    for kind in kinds:
+        moderated = MODERATED[kind]
+        order = [moderated.submitted_on, moderated.model.id]
+        branch = db.select(_columns(kind)).where(db.and_(*pending(moderated.model)))
+        if cursor:
+            keys = [moderated.submitted_on, db.literal(kind, db.String), moderated.model.id]
+            branch = branch.where(after(keys, decode_cursor(cursor, keys), descending=False))
+        # Wrapped so each branch keeps its own ORDER BY and LIMIT.
+        branches.append(db.select([branch.order_by(*order).limit(limit + 1).alias()]))
+    merged = db.union_all(*branches).alias('queue') if len(branches) > 1 else branches[0].alias('queue')
+    rows = db.session.execute(db.select([merged]).order_by(
+        merged.c.submitted_on, merged.c.kind, merged.c.id).limit(limit + 1)).fetchall()
+    items = [QueueItem(*row) for row in rows]
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([items[-1].submitted_on, items[-1].kind, items[-1].id])
+    return KeysetPage(items, next_cursor)
+
+
+def pending_counts():
+    """Return ``{kind: number of pending items}`` in one statement."""
+    counts = db.session.execute(db.select([
+        db.select([db.func.count()]).select_from(moderated.model.__table__)
+                                    .where(db.and_(*pending(moderated.model))).as_scalar().label(kind)
+        for kind, moderated in MODERATED.items()])).first()
+    return OrderedDict((kind, count) for kind, count in zip(MODERATED, counts))
+
+
+def _message(kind, title, approve, reason):
+    subject = 'membership' if kind == 'user' else '{} "{}"'.format(kind, title)
+    message = 'Your {} has been {}.'.format(subject, 'approved' if approve else 'rejected')
+    if reason:
+        message += ' ' + reason
+    return message
+
+
+def moderate(selection, moderator_id, approve=True, reason=None):
+    """Approve or reject pending items, given as ``{kind: [id, ...]}``.
+
+    Items that are no longer pending are skipped.  Submitters are notified
+    of every item this call changed.  Returns the number changed per kind.
+    """
+    check_kinds(selection)
+    now = datetime.utcnow()
+    changed = OrderedDict()
+    stamped = []
+    for kind, ids in selection.items():
+        if not ids:
+            continue
+        model = MODERATED[kind].model
+        if approve:
+            on, by, values = model.approved_on, model.approved_by, {model.approved_on: now}
+            if model is User:
+                values[User.approved] = True
+        else:
+            on, by, values = model.rejected_on, model.rejected_by, {model.rejected_on: now}
+        values[by] = moderator_id
+        changed[kind] = model.query.filter(model.id.in_(ids), *pending(model)) \
+                                   .update(values, synchronize_session=False)
+        if changed[kind]:
+            stamped.append(db.select(_columns(kind)).where(db.and_(model.id.in_(ids), on == now,
+                                                                   by == moderator_id)))
+    if stamped:
+        rows = [QueueItem(*row) for row in db.session.execute(
+            db.union_all(*stamped) if len(stamped) > 1 else stamped[0])]
+        for item in rows:
+            if item.kind == 'user':
+                identity_cache.invalidate(item.id)
+        reindex(db.session, [(item.kind, item.id) for item in rows if item.kind in INDEXED])
+        Notification.deliver([{'title': 'Approved' if approve else 'Not approved',
+                               'message': _message(item.kind, item.title, approve, reason),
+                               'created_by': moderator_id,
+                               'sent_to': item.submitted_by,
+                               'created_on': now}
+                              for item in rows if item.submitted_by is not None])
+    db.session.commit()
+    return changed
@@ -0,0 +1,91 @@
+import hashlib
+
+from flask import current_app, request, session, g
+
+from .cache import TTLCache
+
+
+class PageCache(object):
+    """Serve rendered public pages to anonymous visitors from memory.
+
+    Views opt in with ``@page_cache.cached(ttl)``.  A cached page is served
+    from the first ``before_request`` hook, so neither the view nor the
+    Flask-Login machinery runs, and it carries a strong ETag so browsers can
+    revalidate with ``If-None-Match`` and get a ``304``.  Entries are keyed on
+    the path and the query string.  The cache is bypassed for logged-in
+    users, token-authenticated requests and when flashed messages are
+    pending.  ``invalidate(endpoint)`` drops the pages of one endpoint,
+    ``invalidate()`` everything, but only in the calling process: other
+    workers keep serving their copies until the TTL runs out.
+    """
+
+    def __init__(self, app=None):
+        self.store = TTLCache()
+        self.generations = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['PAGE_CACHE_ENABLED']
+        self.store = TTLCache(maxsize=app.config['PAGE_CACHE_SIZE'])
+        app.before_request_funcs.setdefault(None, []).insert(0, self._serve)
+        app.after_request(self._save)
+
+    def cached(self, ttl):
+        def decorator(f):
+            f.page_cache_ttl = ttl
+            return f
+        return decorator
+
+    def invalidate(self, endpoint=None):
+        if endpoint is None:
+            self.store.clear()
+        else:
+            self.generations[endpoint] = self.generations.get(endpoint, 0) + 1
+
+    def _ttl(self):
+        if not self.enabled or request.method not in ('GET', 'HEAD'):
+            return None
+        ttl = getattr(current_app.view_functions.get(request.endpoint), 'page_cache_ttl', None)
+        if ttl is None:
+            return None
+        remember_cookie = current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')
+        if session.get('user_id') or session.get('_flashes') or \
+                request.cookies.get(remember_cookie) or 'Authorization' in request.headers:
+            return None
+        return ttl
+
+    def _key(self):
+        return (request.endpoint, self.generations.get(request.endpoint, 0), request.path,
+                tuple(sorted(request.args.items(multi=True))))
+
+    def _serve(self):
+        if self._ttl() is None:
+            return None
+        entry = self.store.get(self._key())
+        if entry is None:
+            return None
+        body, status, headers, etag = entry
+        g.page_cache_hit = True
+        response = current_app.response_class(body, status, headers)
+        response.set_etag(etag)
+        response.headers['X-Page-Cache'] = 'HIT'
+        return response.make_conditional(request)
+
+    def _save(self, response):
+        if g.get('page_cache_hit'):
+            return response
+        ttl = self._ttl()
+        if ttl is None or request.method != 'GET' or response.status_code != 200 or \
+                response.direct_passthrough or session.modified:
+            return response
+        body = response.get_data()
+        etag = hashlib.sha1(body).hexdigest()
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Cookie')
+        headers = [(k, v) for k, v in response.headers
+                   if k.lower() not in ('set-cookie', 'content-length', 'etag')]
+        self.store.set(self._key(), (body, response.status_code, headers, etag), ttl=ttl)
+        response.set_etag(etag)
+        response.headers['X-Page-Cache'] = 'MISS'
+        return response.make_conditional(request)
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import current_app, request
+from sqlalchemy import and_, or_, DateTime
+
+from .exceptions import ValidationError
+
+CURSOR_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+TIMESTAMP_FORMATS = (CURSOR_DATETIME_FORMAT, '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d')
+
+
+class KeysetPage(object):
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(values):
+    values = [v.strftime(CURSOR_DATETIME_FORMAT) if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, columns):
+    """Decode a cursor made by ``encode_cursor``; raises ValidationError if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (TypeError, ValueError, UnicodeError, binascii.Error) as e:
+        raise ValidationError('Invalid cursor: {}'.format(e))
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValidationError('Invalid cursor')
+    decoded = []
+    for column, value in zip(columns, values):
+        if value is not None and isinstance(column.type, DateTime):
+            try:
+                value = datetime.strptime(value, CURSOR_DATETIME_FORMAT)
+            except (TypeError, ValueError):
+                raise ValidationError('Invalid cursor')
+        decoded.append(value)
+    return decoded
+
+
+def parse_timestamp(value, name='timestamp'):
+    """Parse an ISO 8601 timestamp from a request; raises ValidationError if it is not one."""
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            pass
+    raise ValidationError('{} must be an ISO 8601 timestamp'.format(name))
+
+
+def page_limit(default=None):
+    """Read ``limit`` from the query string, clamped to 1..``API_PAGE_SIZE_MAX``."""
+    config = current_app.config
+    limit = request.args.get('limit', default or config['API_PAGE_SIZE'], type=int)
+    return max(1, min(limit, config['API_PAGE_SIZE_MAX']))
+
+
+def after(columns, values, descending=True):
+    """Build the WHERE clause selecting rows strictly after ``values`` in sort order."""
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        beyond = column < value if descending else column > value
+        clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])] + [beyond]))
+    # The bound on the leading column is implied by the OR, but planners
+    # only seek an index on plain range conditions; without it every page
+    # scans the index from the start.
+    leading = columns[0] <= values[0] if descending else columns[0] >= values[0]
+    return and_(leading, or_(*clauses))
+
+
+def keyset_paginate(query, columns, cursor=None, limit=20, descending=True):
+    """Return one page of ``query`` ordered by ``columns``, seeking past ``cursor``.
+
+    The last column must make the ordering unique (normally the primary key).
+    Unlike OFFSET pagination every page costs the same, as long as an index
+    covers the filter and the sort columns.
+    """
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    if cursor:
+        query = query.filter(after(columns, decode_cursor(cursor, columns), descending))
+    order = [c.desc() if descending else c.asc() for c in columns]
+    items = query.order_by(*order).limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([getattr(items[-1], c.key) for c in columns])
+    return KeysetPage(items, next_cursor)
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import request, current_app
+
+from .metrics import RATELIMIT_REJECTIONS
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after):
+        super(RateLimitExceeded, self).__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class RateLimiter(object):
+    """Token-bucket admission control for expensive POST endpoints.
+
+    Every limit in ``RATELIMITS`` maps a name to ``(capacity, refill_per_second)``
+    and is applied twice: once per client address and once per submitted
+    email.  Buckets live in the SQLite database at ``RATELIMIT_STORAGE`` so the
+    limits hold across all gunicorn workers on a host.
+    """
+
+    schema = 'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)'
+    prune_every = 1000
+
+    def __init__(self, app=None):
+        self.local = threading.local()
+        self.calls = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config['RATELIMIT_ENABLED']
+        self.path = app.config['RATELIMIT_STORAGE']
+        self.limits = app.config['RATELIMITS']
+        self.local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork.
+        if getattr(self.local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute(self.schema)
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def consume(self, key, capacity, rate):
+        """Take a token from the bucket; returns 0 if allowed, else seconds to wait."""
+        connection = self._connection()
+        now = time.time()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                               (key, tokens, now))
+            self.calls += 1
+            if self.calls % self.prune_every == 0:
+                connection.execute('DELETE FROM buckets WHERE updated < ?', (now - 86400,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+    def limit(self, name):
+        """Reject POSTs to the decorated view with 429 once the ``name`` limit is spent."""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if self.enabled and request.method == 'POST':
+                    capacity, rate = self.limits[name]
+                    keys = [('ip', request.remote_addr)]
+                    email = request.form.get('email', '').strip().lower()
+                    if email:
+                        keys.append(('email', email))
+                    for kind, value in keys:
+                        key = '{}:{}:{}'.format(name, kind, value)
+                        wait = self.consume(key, capacity, rate)
+                        if wait:
+                            RATELIMIT_REJECTIONS.labels(name, kind).inc()
+                            current_app.logger.warning('Rate limit %s exceeded for %s', name, key)
+                            raise RateLimitExceeded(int(wait) + 1)
+                return f(*args, **kwargs)
+            return decorated_function
+        return decorator
@@ -0,0 +1,291 @@
+"""Ranked full-text search over members, skills, categories, ventures and companies.
+
+Every searchable object has one row in ``search_documents`` holding a title
+and a body.  On Postgres the rows are matched through a GIN index over their
+weighted ``tsvector`` plus a trigram index on the title, for misspelled or
+partial names; on SQLite an external-content FTS5 table, kept in sync by
+triggers, does the matching and ranks with bm25.
+
+Members, ventures and companies are only indexed once approved and while
+not rejected, so search never reveals what their listings hide.
+
+Documents are rewritten in the same transaction whenever an indexed object is
+inserted, deleted, or has an indexed attribute changed through the ORM.  So
+are the documents that embed it: renaming or moving a category rewrites the
+lineage of its whole subtree, renaming a category the skills filed under it,
+and renaming a skill the members who have it.  ``manage.py seed`` rebuilds
+the index when it is done; rows written with other Core statements (bulk
+updates) are picked up by ``manage.py reindex``.
+"""
+import re
+from collections import namedtuple, OrderedDict
+
+from flask import current_app
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import DDL, event, text
+from sqlalchemy.schema import UniqueConstraint
+
+from . import db
+from .exceptions import ValidationError
+from .models import User, Skill, Category, Venture, Company, skills_category, user_skills
+
+search_documents = db.Table('search_documents',
+                            db.Column('id', db.Integer, primary_key=True),
+                            db.Column('kind', db.String(16), nullable=False),
+                            db.Column('object_id', db.Integer, nullable=False),
+                            db.Column('title', db.Text(), nullable=False),
+                            db.Column('body', db.Text(), nullable=False),
+                            UniqueConstraint('kind', 'object_id'),
+                            )
+
+# Must match the expression of the GIN index for Postgres to use it.
+PG_DOCUMENT = "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')"
+
+for statement in (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX ix_search_documents_document ON search_documents USING gin (({}))".format(PG_DOCUMENT),
+        "CREATE INDEX ix_search_documents_title_trgm ON search_documents USING gin (title gin_trgm_ops)"):
+    event.listen(search_documents, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+for statement in (
+        "CREATE VIRTUAL TABLE search_documents_fts USING fts5("
+        "title, body, content='search_documents', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+        "INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+        "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+        "INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body) "
+        "VALUES ('delete', old.id, old.title, old.body); END",
+        "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+        "INSERT INTO search_documents_fts(search_documents_fts, rowid, title, body) "
+        "VALUES ('delete', old.id, old.title, old.body); "
+        "INSERT INTO search_documents_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END"):
+    event.listen(search_documents, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(search_documents, 'before_drop',
+             DDL('DROP TABLE IF EXISTS search_documents_fts').execute_if(dialect='sqlite'))
+
+SearchResult = namedtuple('SearchResult', ['kind', 'id', 'title', 'rank'])
+
+
+def _join(*parts):
+    return ' '.join(part for part in parts if part)
+
+
+def _user_document(user):
+    return user.display_name, _join(user.location, user.about_me, *(skill.name for skill in user.skills))
+
+
+def _skill_document(skill):
+    return skill.name, _join(skill.description, *(category.name for category in skill.categories))
+
+
+def _category_document(category):
+    return category.name, _join(category.description, str(category))
+
+
+def _venture_document(venture):
+    return venture.name, _join(venture.description, venture.public_info)
+
+
+def _company_document(company):
+    return company.name, _join(company.description)
+
+
+# kind -> (model, attributes the document depends on, document builder,
+# relationships to eager load when rebuilding, approval column or None if
+# every row is indexed)
+Indexed = namedtuple('Indexed', ['model', 'attributes', 'document', 'eager', 'approval'])
+
+INDEXED = OrderedDict([
+    ('user', Indexed(User, ('first_name', 'last_name', 'username', 'email', 'location', 'about_me', 'skills',
+                            'approved', 'rejected_on'), _user_document, ('skills',), 'approved')),
+    ('skill', Indexed(Skill, ('name', 'description', 'categories'), _skill_document, ('categories',), None)),
+    ('category', Indexed(Category, ('name', 'description', 'lineage', 'parent_id'), _category_document, (), None)),
+    ('venture', Indexed(Venture, ('name', 'description', 'public_info', 'approved_on', 'rejected_on'),
+                        _venture_document, (), 'approved_on')),
+    ('company', Indexed(Company, ('name', 'description', 'approved_on', 'rejected_on'),
+                        _company_document, (), 'approved_on')),
+])
+KINDS = dict((indexed.model, kind) for kind, indexed in INDEXED.items())
+
+# Dependent documents are rebuilt this many objects at a time.
+REINDEX_BATCH = 500
+
+
+def published(kind, obj):
+    """True if ``obj`` may be found by every member: approved and not rejected."""
+    approval = INDEXED[kind].approval
+    return approval is None or (bool(getattr(obj, approval)) and obj.rejected_on is None)
+
+
+def published_criteria(kind):
+    """The SQL equivalent of ``published``."""
+    indexed = INDEXED[kind]
+    if indexed.approval is None:
+        return []
+    column = getattr(indexed.model, indexed.approval)
+    approved = column == True if isinstance(column.type, db.Boolean) else column.isnot(None)
+    return [approved, indexed.model.rejected_on.is_(None)]
+
+
+def document_row(kind, obj):
+    title, body = INDEXED[kind].document(obj)
+    return {'kind': kind, 'object_id': obj.id, 'title': title or '', 'body': body or ''}
+
+
+def write_documents(connection, changed):
+    """Replace the documents of ``changed``, a ``{(kind, id): obj or None}`` dict.
+
+    Objects that are None or unpublished are only removed from the index.
+    """
+    by_kind = {}
+    for kind, object_id in changed:
+        by_kind.setdefault(kind, []).append(object_id)
+    for kind, object_ids in by_kind.items():
+        connection.execute(search_documents.delete().where(db.and_(
+            search_documents.c.kind == kind, search_documents.c.object_id.in_(object_ids))))
+    rows = [document_row(kind, obj) for (kind, _), obj in changed.items()
+            if obj is not None and published(kind, obj)]
+    if rows:
+        connection.execute(search_documents.insert(), rows)
+
+
+def _changed(obj, attributes):
+    state = db.inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+@event.listens_for(SignallingSession, 'after_flush')
+def _reindex_flushed(session, flush_context):
+    changed = {}
+    for obj in session.new:
+        kind = KINDS.get(type(obj))
+        if kind is not None:
+            changed[(kind, obj.id)] = obj
+    for obj in session.dirty:
+        kind = KINDS.get(type(obj))
+        if kind is not None and _changed(obj, INDEXED[kind].attributes):
+            changed[(kind, obj.id)] = obj
+    for obj in session.deleted:
+        kind = KINDS.get(type(obj))
+        if kind is not None:
+            changed[(kind, obj.id)] = None
+    if changed:
+        write_documents(session.connection(), changed)
+    dependents = _dependents(session).difference(changed)
+    if dependents:
+        session.info.setdefault('search_dependents', set()).update(dependents)
+
+
+def _dependents(session):
+    """``(kind, id)`` of the documents embedding attributes changed by this flush.
+
+    Descendant lineages are rewritten by a Core statement in
+    ``models._category_updated``, so they never show up as changed here.
+    """
+    moved = [obj for obj in session.dirty
+             if isinstance(obj, Category) and obj.path and _changed(obj, ('name', 'parent_id'))]
+    renamed_categories = [obj.id for obj in session.dirty if isinstance(obj, Category) and _changed(obj, ('name',))]
+    renamed_skills = [obj.id for obj in session.dirty if isinstance(obj, Skill) and _changed(obj, ('name',))]
+    connection = session.connection()
+    dependents = set()
+    if moved:
+        categories = Category.__table__
+        dependents.update(('category', category_id) for (category_id,) in connection.execute(
+            db.select([categories.c.id]).where(db.or_(*[categories.c.path.startswith(obj.path) for obj in moved]))))
+    if renamed_categories:
+        dependents.update(('skill', skill_id) for (skill_id,) in connection.execute(
+            db.select([skills_category.c.skill_id]).where(skills_category.c.category_id.in_(renamed_categories))))
+    if renamed_skills:
+        dependents.update(('user', user_id) for (user_id,) in connection.execute(
+            db.select([user_skills.c.user_id]).where(user_skills.c.skill_id.in_(renamed_skills))))
+    return dependents
+
+
+def reindex(session, keys):
+    """Rewrite the documents of ``keys``, ``(kind, id)`` pairs, from the database.
+
+    For rows changed with bulk or Core statements, which the session events
+    never see; objects already in the session are refreshed.
+    """
+    by_kind = {}
+    for kind, object_id in sorted(keys):
+        by_kind.setdefault(kind, []).append(object_id)
+    for kind, object_ids in by_kind.items():
+        indexed = INDEXED[kind]
+        model = indexed.model
+        for start in range(0, len(object_ids), REINDEX_BATCH):
+            chunk = object_ids[start:start + REINDEX_BATCH]
+            changed = dict(((kind, object_id), None) for object_id in chunk)
+            for obj in session.query(model).options(*(db.subqueryload(name) for name in indexed.eager)) \
+                                           .filter(model.id.in_(chunk)).populate_existing():
+                changed[(kind, obj.id)] = obj
+            write_documents(session.connection(), changed)
+
+
+@event.listens_for(SignallingSession, 'after_flush_postexec')
+def _reindex_dependents(session, flush_context):
+    # Loading objects is left until the flush has finished.
+    dependents = session.info.pop('search_dependents', None)
+    if dependents:
+        reindex(session, dependents)
+
+
+def fts5_query(terms):
+    # Quoted terms keep FTS5 operators in user input from being interpreted;
+    # the last term matches as a prefix for search-as-you-type.
+    return ' '.join('"{}"'.format(term) for term in terms[:-1]) + ' "{}"*'.format(terms[-1])
+
+
+class SearchIndex(object):
+    def search(self, q, kinds=None, limit=None):
+        """Return up to ``limit`` ``SearchResult`` tuples for ``q``, best first."""
+        terms = re.findall(r'\w+', q or '', re.UNICODE)
+        if not terms:
+            return []
+        params = {'limit': max(1, limit or current_app.config['SEARCH_RESULTS'])}
+        kind_filter = ''
+        if kinds:
+            unknown = set(kinds) - set(INDEXED)
+            if unknown:
+                raise ValidationError('Unknown search kind: {}'.format(', '.join(sorted(unknown))))
+            params.update(('kind_{}'.format(i), kind) for i, kind in enumerate(kinds))
+            kind_filter = 'AND d.kind IN ({})'.format(
+                ', '.join(':kind_{}'.format(i) for i in range(len(kinds))))
+        if db.session.get_bind().dialect.name == 'postgresql':
+            params['q'] = ' '.join(terms)
+            statement = ("SELECT d.kind, d.object_id, d.title, "
+                         "ts_rank({document}, query) + similarity(d.title, :q) AS rank "
+                         "FROM search_documents d, plainto_tsquery('english', :q) query "
+                         "WHERE ({document} @@ query OR d.title % :q) {kinds} "
+                         "ORDER BY rank DESC LIMIT :limit").format(document=PG_DOCUMENT, kinds=kind_filter)
+        else:
+            params['q'] = fts5_query(terms)
+            statement = ("SELECT d.kind, d.object_id, d.title, -bm25(search_documents_fts, 10.0, 1.0) AS rank "
+                         "FROM search_documents_fts JOIN search_documents d ON d.id = search_documents_fts.rowid "
+                         "WHERE search_documents_fts MATCH :q {kinds} "
+                         "ORDER BY rank DESC LIMIT :limit").format(kinds=kind_filter)
+        return [SearchResult(*row) for row in db.session.execute(text(statement), params)]
+
+    def rebuild(self, batch_size=2000):
+        """Rewrite every document; returns the number written per kind."""
+        counts = OrderedDict()
+        db.session.execute(search_documents.delete())
+        for kind, indexed in INDEXED.items():
+            model = indexed.model
+            counts[kind] = 0
+            last_id = 0
+            while True:
+                batch = model.query.options(*(db.subqueryload(name) for name in indexed.eager)) \
+                                   .filter(model.id > last_id, *published_criteria(kind)) \
+                                   .order_by(model.id).limit(batch_size).all()
+                if not batch:
+                    break
+                db.session.execute(search_documents.insert(), [document_row(kind, obj) for obj in batch])
+                counts[kind] += len(batch)
+                last_id = batch[-1].id
+                db.session.expunge_all()
+        db.session.commit()
+        return counts
+
+
+search_index = SearchIndex()
@@ -0,0 +1,269 @@
+"""Deterministic synthetic data for development and load testing.
+
+Rows are generated from a seeded random number generator and written with
+bulk Core inserts in batches, bypassing the ORM, so large datasets load
+quickly::
+
+    python manage.py seed --users 100000 --notifications 1000000 --seed 42
+
+New rows get explicit ids following the highest existing id of each table, so
+seeding can be repeated on top of an existing database.  Derived columns the
+ORM events normally maintain (``Category.path``/``lineage``,
+``User.unread_count``, the skill and group counters and the search index)
+are computed here as well.
+"""
+import hashlib
+import random
+from datetime import datetime, timedelta
+from itertools import islice
+
+from . import db, identity_cache, group_cache
+from .search import search_index
+from .models import User, Group, Category, Skill, Company, Resource, Venture, VentureResource, \
+    VentureSkill, Notification, group_memberships, skills_category, user_skills, company_resources, \
+    initialize_database, refresh_counts
+
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery',
+               'Quinn', 'Drew', 'Robin', 'Kim', 'Lee', 'Pat', 'Chris']
+LAST_NAMES = ['Smith', 'Garcia', 'Nguyen', 'Chen', 'Patel', 'Kowalski', 'Okafor', 'Silva',
+              'Novak', 'Larsen', 'Haddad', 'Tanaka', 'Murphy', 'Rossi', 'Cohen', 'Ivanova']
+LOCATIONS = ['Boston', 'Cambridge', 'Somerville', 'Providence', 'Worcester', 'Portland',
+             'Hartford', 'New Haven', None]
+WORDS = ['cloud', 'data', 'design', 'robotics', 'health', 'energy', 'mobile', 'finance',
+         'security', 'media', 'food', 'education', 'games', 'retail', 'travel', 'music']
+
+# Timestamps are spread over a fixed window so a given seed always produces
+# the same rows.
+EPOCH = datetime(2015, 1, 1)
+WINDOW = timedelta(days=365)
+
+SEEDED_PASSWORD = 'puppy'
+
+
+def batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+
+class Seeder(object):
+    def __init__(self, seed=0, batch_size=10000):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.counts = {}
+
+    def insert(self, table, rows):
+        inserted = 0
+        for batch in batches(rows, self.batch_size):
+            db.session.execute(table.insert(), batch)
+            inserted += len(batch)
+        self.counts[table.name] = self.counts.get(table.name, 0) + inserted
+        return inserted
+
+    def moment(self):
+        return EPOCH + timedelta(seconds=self.random.randrange(int(WINDOW.total_seconds())))
+
+    def sample_ids(self, ids, k):
+        return self.random.sample(ids, min(k, len(ids)))
+
+    def users(self, count):
+        first = next_id(User)
+        # Hashing a password per row would take longer than the rest of the
+        # seeding put together; every seeded user shares one (its salt is the
+        # only part of the dataset the seed does not fix).
+        password_hash = User(password=SEEDED_PASSWORD).password_hash
+        approver = first if count else None
+
+        def rows():
+            for user_id in range(first, first + count):
+                email = 'user{}@example.com'.format(user_id)
+                registered_on = self.moment()
+                approved = self.random.random() < 0.8
+                yield {'id': user_id,
+                       'email': email,
+                       'username': 'user{}'.format(user_id),
+                       'first_name': self.random.choice(FIRST_NAMES),
+                       'last_name': self.random.choice(LAST_NAMES),
+                       'password_hash': password_hash,
+                       'location': self.random.choice(LOCATIONS),
+                       'confirmed': self.random.random() < 0.9,
+                       'registered_on': registered_on,
+                       'approved': approved,
+                       'approved_on': registered_on + timedelta(days=1) if approved else None,
+                       'approved_by': approver if approved else None,
+                       'last_seen': registered_on + timedelta(seconds=self.random.randrange(86400 * 90)),
+                       'avatar_hash': hashlib.md5(email.encode('utf-8')).hexdigest(),
+                       'unread_count': 0,
+                       'token_generation': 0}
+        self.insert(User.__table__, rows())
+        return list(range(first, first + count))
+
+    def groups(self, count, user_ids, groups_per_user=2):
+        first = next_id(Group)
+        self.insert(Group.__table__, ({'id': group_id,
+                                       'name': 'Group {}'.format(group_id),
+                                       'description': 'Generated group',
+                                       'default': False}
+                                      for group_id in range(first, first + count)))
+        group_ids = list(range(first, first + count))
+        default_group = Group.query.filter_by(name='User').first()
+
+        def rows():
+            for user_id in user_ids:
+                if default_group is not None:
+                    yield {'user_id': user_id, 'group_id': default_group.id}
+                for group_id in self.sample_ids(group_ids, self.random.randint(0, groups_per_user)):
+                    yield {'user_id': user_id, 'group_id': group_id}
+        self.insert(group_memberships, rows())
+        return group_ids
+
+    def categories(self, count, depth):
+        """Insert ``count`` categories spread over ``depth`` levels, with path and lineage."""
+        first = next_id(Category)
+        rows = []
+        levels = []
+        for category_id in range(first, first + count):
+            level = min(len(rows) * depth // count, len(levels))
+            if level == len(levels):
+                levels.append([])
+            name = '{} {}'.format(self.random.choice(WORDS).capitalize(), category_id)
+            parent = self.random.choice(levels[level - 1]) if level else None
+            row = {'id': category_id,
+                   'name': name,
+                   'description': 'Generated category',
+                   'parent_id': parent['id'] if parent else None,
+                   'path': '{}{}/'.format(parent['path'] if parent else '/', category_id),
+                   'lineage': parent['lineage'] + Category.lineage_separator + name if parent else name}
+            levels[level].append(row)
+            rows.append(row)
+        self.insert(Category.__table__, rows)
+        return [row['id'] for row in rows]
+
+    def skills(self, count, category_ids, user_ids, skills_per_user=3):
+        first = next_id(Skill)
+        skill_ids = list(range(first, first + count))
+        self.insert(Skill.__table__, ({'id': skill_id,
+                                       'name': 'Skill {}'.format(skill_id),
+                                       'description': 'Generated skill'}
+                                      for skill_id in skill_ids))
+        self.insert(skills_category, ({'skill_id': skill_id, 'category_id': category_id}
+                                      for skill_id in skill_ids
+                                      for category_id in self.sample_ids(category_ids, self.random.randint(1, 2))))
+        self.insert(user_skills, ({'user_id': user_id, 'skill_id': skill_id}
+                                  for user_id in user_ids
+                                  for skill_id in self.sample_ids(skill_ids, self.random.randint(0, skills_per_user))))
+        return skill_ids
+
+    def owned(self, model, count, user_ids, label):
+        """Insert ``count`` rows of a model with created_by/approved_by columns."""
+        first = next_id(model)
+
+        def rows():
+            for row_id in range(first, first + count):
+                created_on = self.moment()
+                approved = self.random.random() < 0.7
+                yield {'id': row_id,
+                       'name': '{} {} {}'.format(self.random.choice(WORDS).capitalize(), label, row_id),
+                       'description': 'Generated {}'.format(label.lower()),
+                       'created_on': created_on,
+                       'created_by': self.random.choice(user_ids),
+                       'approved_on': created_on + timedelta(days=2) if approved else None,
+                       'approved_by': user_ids[0] if approved else None}
+        self.insert(model.__table__, rows())
+        return list(range(first, first + count))
+
+    def companies(self, count, user_ids, resource_ids, resources_per_company=3):
+        company_ids = self.owned(Company, count, user_ids, 'Company')
+        self.insert(company_resources, ({'company_id': company_id, 'resource_id': resource_id}
+                                        for company_id in company_ids
+                                        for resource_id in self.sample_ids(resource_ids, resources_per_company)))
+        return company_ids
+
+    def ventures(self, count, user_ids, company_ids, resource_ids, skill_ids):
+        first = next_id(Venture)
+        venture_ids = list(range(first, first + count))
+
+        def rows():
+            for venture_id in venture_ids:
+                created_on = self.moment()
+                approved = self.random.random() < 0.7
+                kind = self.random.random()
+                yield {'id': venture_id,
+                       'name': '{} Venture {}'.format(self.random.choice(WORDS).capitalize(), venture_id),
+                       'description': 'Generated venture',
+                       'public_info': 'Generated public information',
+                       'created_on': created_on,
+                       'created_by': self.random.choice(user_ids),
+                       'approved_on': created_on + timedelta(days=2) if approved else None,
+                       'approved_by': user_ids[0] if approved else None,
+                       'student_venture': kind < 0.6,
+                       'alumni_venture': 0.6 <= kind < 0.85,
+                       'external_venture': kind >= 0.85}
+        self.insert(Venture.__table__, rows())
+        if company_ids and resource_ids:
+            self.insert(VentureResource.__table__, ({'venture_id': venture_id,
+                                                     'company_id': self.random.choice(company_ids),
+                                                     'resource_id': self.random.choice(resource_ids)}
+                                                    for venture_id in venture_ids
+                                                    for _ in range(self.random.randint(0, 3))))
+        if skill_ids:
+            self.insert(VentureSkill.__table__, ({'venture_id': venture_id,
+                                                  'user_id': self.random.choice(user_ids),
+                                                  'skill_id': self.random.choice(skill_ids)}
+                                                 for venture_id in venture_ids
+                                                 for _ in range(self.random.randint(0, 4))))
+        return venture_ids
+
+    def notifications(self, count, user_ids):
+        def rows():
+            for _ in range(count):
+                created_on = self.moment()
+                read = self.random.random() < 0.5
+                yield {'title': 'Notification',
+                       'message': 'Generated notification about {}'.format(self.random.choice(WORDS)),
+                       'created_on': created_on,
+                       'created_by': self.random.choice(user_ids),
+                       'sent_to': self.random.choice(user_ids),
+                       'read_on': created_on + timedelta(hours=1) if read else None}
+        self.insert(Notification.__table__, rows())
+        User.refresh_unread_counts()
+
+    def reset_sequences(self):
+        """Move Postgres id sequences past the explicitly inserted ids."""
+        if db.session.get_bind().dialect.name != 'postgresql':
+            return
+        for model in (User, Group, Category, Skill, Company, Resource, Venture, VentureResource,
+                      VentureSkill, Notification):
+            db.session.execute("SELECT setval(pg_get_serial_sequence('{0}', 'id'), "
+                               "coalesce(max(id), 0) + 1, false) FROM {0}".format(model.__tablename__))
+
+
+def seed_database(users=1000, groups=10, categories=100, category_depth=3, skills=200,
+                  companies=50, resources=100, ventures=200, notifications=5000,
+                  seed=0, batch_size=10000):
+    """Generate a synthetic dataset; returns the number of rows written per table."""
+    initialize_database()
+    seeder = Seeder(seed, batch_size)
+    new_user_ids = seeder.users(users)
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+    seeder.groups(groups, new_user_ids)
+    category_ids = seeder.categories(categories, category_depth)
+    skill_ids = seeder.skills(skills, category_ids, new_user_ids) if category_ids else []
+    resource_ids = seeder.owned(Resource, resources, user_ids, 'Resource')
+    company_ids = seeder.companies(companies, user_ids, resource_ids)
+    seeder.ventures(ventures, user_ids, company_ids, resource_ids, skill_ids)
+    seeder.notifications(notifications, user_ids)
+    refresh_counts(db.session)
+    seeder.reset_sequences()
+    db.session.commit()
+    seeder.counts['search_documents'] = sum(search_index.rebuild().values())
+    identity_cache.clear()
+    group_cache.clear()
+    return seeder.counts
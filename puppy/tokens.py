@@ -0,0 +1,71 @@
+import time
+
+from itsdangerous import TimedJSONWebSignatureSerializer as Serializer, BadData
+
+from .cache import TTLCache
+
+
+class TokenAuthority(object):
+    """Issue and verify the signed tokens used by the API.
+
+    A token is ``<key id>.<JSON web signature>``.  ``AUTH_TOKEN_KEYS`` maps key
+    ids to secrets and new tokens are signed with ``AUTH_TOKEN_CURRENT_KEY``,
+    so secrets can be rotated by adding a key, switching to it, and removing
+    the old one once its tokens have expired (removing it early revokes them).
+    Serializers are built once per key and verified tokens are cached until
+    they expire, so a repeat request costs a dictionary lookup.  Tokens also
+    carry the user's ``token_generation``; bumping it revokes all of that
+    user's tokens.  The check reads the per-process identity cache, not the
+    database, so other workers keep accepting revoked tokens until their
+    cached copy of the user expires, up to ``IDENTITY_CACHE_TTL`` seconds.
+    """
+
+    def __init__(self, app=None):
+        self.serializers = {}
+        self.cache = TTLCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.keys = dict(app.config['AUTH_TOKEN_KEYS']) or {'default': app.config['SECRET_KEY']}
+        self.current_key = app.config['AUTH_TOKEN_CURRENT_KEY']
+        if self.current_key not in self.keys:
+            raise ValueError('AUTH_TOKEN_CURRENT_KEY {!r} is not one of AUTH_TOKEN_KEYS'.format(self.current_key))
+        self.serializers = {}
+        self.cache = TTLCache(maxsize=app.config['AUTH_TOKEN_CACHE_SIZE'])
+
+    def _serializer(self, key_id, expires_in=None):
+        serializer = self.serializers.get((key_id, expires_in))
+        if serializer is None and key_id in self.keys:
+            serializer = Serializer(self.keys[key_id], expires_in=expires_in)
+            self.serializers[(key_id, expires_in)] = serializer
+        return serializer
+
+    def generate(self, user, expiration):
+        signed = self._serializer(self.current_key, expiration).dumps(
+            {'id': user.id, 'gen': user.token_generation})
+        return '{}.{}'.format(self.current_key, signed.decode('ascii'))
+
+    def verify(self, token):
+        """Return the user the token belongs to, or None if it is invalid, expired or revoked."""
+        from .models import load_user
+        entry = self.cache.get(token)
+        if entry is None:
+            key_id, _, signed = token.partition('.')
+            serializer = self._serializer(key_id)
+            if serializer is None:
+                return None
+            try:
+                data, header = serializer.loads(signed, return_header=True)
+                entry = (int(data['id']), data.get('gen', 0), header['exp'])
+            except (BadData, KeyError, TypeError, ValueError):
+                return None
+            self.cache.set(token, entry, ttl=entry[2] - time.time())
+        user_id, generation, expires = entry
+        if expires < time.time():
+            self.cache.invalidate(token)
+            return None
+        user = load_user(user_id)
+        if user is None or user.token_generation != generation:
+            return None
+        return user
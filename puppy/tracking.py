@@ -0,0 +1,96 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam
+
+from .metrics import LAST_SEEN_TOUCHES, LAST_SEEN_SKIPPED, LAST_SEEN_FLUSHES, LAST_SEEN_ROWS
+
+
+class LastSeenTracker(object):
+    """Coalesce ``users.last_seen`` writes in memory and flush them in batches.
+
+    Each worker keeps the latest timestamp per user, and a background thread
+    writes all of them with a single executemany UPDATE every
+    ``LAST_SEEN_FLUSH_INTERVAL`` seconds, outside of any request so the
+    write never counts against a request's query budget.  A user whose
+    recorded timestamp is younger than ``LAST_SEEN_RESOLUTION`` seconds is
+    not queued again.  Whatever is still pending is flushed when the process
+    exits.  Touches, skips and writes are counted in the
+    ``puppy_last_seen_*`` metrics.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.recorded = {}
+        self.flusher_pid = None
+        self.exit_registered = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if not self.exit_registered:
+            atexit.register(self.flush)
+            self.exit_registered = True
+
+    def _start_flusher(self):
+        # Started on first use so that every forked worker gets its own thread.
+        with self.lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._flush_periodically, name='last-seen-flusher')
+        thread.daemon = True
+        thread.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.app.config['LAST_SEEN_FLUSH_INTERVAL'])
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('Failed to flush last_seen updates')
+
+    def touch(self, user_id, last_seen=None):
+        now = datetime.utcnow()
+        resolution = timedelta(seconds=self.app.config['LAST_SEEN_RESOLUTION'])
+        LAST_SEEN_TOUCHES.inc()
+        if self.flusher_pid != os.getpid():
+            self._start_flusher()
+        with self.lock:
+            previous = self.recorded.get(user_id)
+            if last_seen is not None and (previous is None or last_seen > previous):
+                previous = last_seen
+            if previous is not None and now - previous < resolution:
+                LAST_SEEN_SKIPPED.inc()
+            else:
+                self.pending[user_id] = now
+                self.recorded[user_id] = now
+
+    def flush(self):
+        """Write every pending timestamp and return the number of rows updated."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            cutoff = datetime.utcnow() - timedelta(seconds=self.app.config['LAST_SEEN_RESOLUTION'])
+            self.recorded = dict((k, v) for k, v in self.recorded.items() if v >= cutoff)
+        if not pending:
+            return 0
+        from . import db
+        from .models import User
+        users = User.__table__
+        statement = users.update().where(users.c.id == bindparam('_id')) \
+                                  .values(last_seen=bindparam('_last_seen'))
+        try:
+            db.get_engine(self.app).execute(
+                statement, [{'_id': k, '_last_seen': v} for k, v in pending.items()])
+        except Exception:
+            self.app.logger.exception('Failed to write %d last_seen updates', len(pending))
+            return 0
+        LAST_SEEN_FLUSHES.inc()
+        LAST_SEEN_ROWS.inc(len(pending))
+        return len(pending)